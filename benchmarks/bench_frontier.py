@@ -0,0 +1,36 @@
+"""
+Times the Frontier application renderer, serial against a process pool.
+
+    python -m benchmarks.bench_frontier --poles 5000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+import file_actions as fa
+from benchmarks import synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--poles', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--per-pole', action='store_true', help='Write a copy of each form for every pole')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = os.path.join(tmp, 'nodes.csv')
+        synthetic.write_workbook(workbook, args.poles)
+        file = fa.read_and_normalize(workbook)
+        frontier = int((file['Owner'] == 'Frontier').sum())
+        pages = -(-frontier // 20)
+        print(f'{args.poles} poles, {frontier} Frontier poles, {pages} applications')
+        for workers in sorted({1, args.workers}):
+            start = time.perf_counter()
+            fa.frontier_pdf(file, tmp, f'bench-{workers}', per_pole=args.per_pole, workers=workers)
+            seconds = time.perf_counter() - start
+            print(f'workers={workers}: {seconds:.2f}s, {pages / seconds:.1f} pages/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Compares load time and peak memory of read_and_normalize against a plain full-sheet read_excel.
+
+    python -m benchmarks.bench_ingest --poles 20000 --extra-columns 200
+
+Every measurement runs in a fresh process so peak RSS is not polluted by earlier runs.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from benchmarks import synthetic
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _full_read(file_path, engine):
+    import pandas
+    file = pandas.read_excel(file_path, engine=engine)
+    return file[[header for header in file.columns if not header.startswith('attribute_')]]
+
+
+def _normalized_read(file_path, engine):
+    import file_actions as fa
+    if engine:
+        fa.excel_engine = lambda: engine
+    return fa.read_and_normalize(file_path)
+
+
+def _measure(target, file_path, engine, results):
+    start = time.perf_counter()
+    target(file_path, engine)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else float('nan')
+    results.put((elapsed, peak))
+
+
+def run(label, target, file_path, engine=None):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(target, file_path, engine, results))
+    process.start()
+    elapsed, peak = results.get()
+    process.join()
+    print(f'{label:<42} {elapsed:8.2f}s {peak:10.0f} MiB peak RSS')
+
+
+def _write_inputs(workbook, csv, poles, extra_columns):
+    synthetic.write_workbook(workbook, poles, extra_columns=extra_columns)
+    synthetic.write_workbook(csv, poles, extra_columns=extra_columns)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--poles', type=int, default=20000)
+    parser.add_argument('--extra-columns', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = os.path.join(tmp, 'nodes.xlsx')
+        csv = os.path.join(tmp, 'nodes.csv')
+        # Generate in a child too: peak RSS carries over from the parent into spawned processes
+        writer = multiprocessing.get_context('spawn').Process(
+            target=_write_inputs, args=(workbook, csv, args.poles, args.extra_columns))
+        writer.start()
+        writer.join()
+        print(f'{args.poles} poles x {args.extra_columns + 13} columns')
+        run('read_excel, all columns (openpyxl)', _full_read, workbook, 'openpyxl')
+        run('read_and_normalize (openpyxl streaming)', _normalized_read, workbook, 'openpyxl')
+        try:
+            import python_calamine  # noqa: F401
+            run('read_and_normalize (calamine)', _normalized_read, workbook, 'calamine')
+        except ImportError:
+            print('python-calamine not installed, skipping calamine')
+        run('read_and_normalize (csv)', _normalized_read, csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Measures how long the app takes to start: the import-time profile of main.py and the time until the first window
+has been drawn. Keep the numbers from each release to spot startup regressions.
+
+    python -m benchmarks.bench_startup --repeat 5
+    python -m benchmarks.bench_startup --json startup.json
+
+Every measurement runs in a fresh interpreter. Time-to-first-window needs a display (and customtkinter/tkinterdnd2)
+and is skipped without one.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the time from launch until the window has been drawn once, then closes it
+FIRST_WINDOW = '''
+import sys, time
+import main
+app = main.App()
+app.update()
+print(time.perf_counter() - float(sys.argv[1]))
+app.destroy()
+'''
+
+
+def import_profile(module: str) -> list[tuple[str, float, float]]:
+    """(module, self seconds, cumulative seconds) for every module imported by `import module`, from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        profile.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return profile
+
+
+def first_window() -> float:
+    """Seconds from launching the interpreter until the window is drawn, including interpreter start-up."""
+    launched = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', FIRST_WINDOW, str(launched)], cwd=ROOT, capture_output=True,
+                            text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = {'python': sys.version.split()[0]}
+    for module in ('main', 'jobs'):
+        try:
+            totals = [import_profile(module)[-1][2] for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f'import {module}: failed ({e})')
+            continue
+        results[f'import_{module}_seconds'] = min(totals)
+        print(f'import {module:<5} best {min(totals):.3f}s of {args.repeat}')
+
+    try:
+        profile = import_profile('main')
+        print('\nSlowest imports of main.py (cumulative):')
+        top = sorted(profile, key=lambda entry: entry[2], reverse=True)[:args.top]
+        for name, own, cumulative in top:
+            print(f'  {cumulative:7.3f}s {own:7.3f}s self  {name}')
+        results['slowest_imports'] = [{'module': name, 'seconds': cumulative} for name, _, cumulative in top]
+    except RuntimeError:
+        pass
+
+    try:
+        timings = [first_window() for _ in range(args.repeat)]
+        results['first_window_seconds'] = min(timings)
+        print(f'\nTime to first window: best {min(timings):.3f}s of {args.repeat}')
+    except RuntimeError as e:
+        print(f'\nTime to first window: skipped ({e})')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Times verizon_app on a synthetic Katapult export.
+
+    python -m benchmarks.bench_verizon --poles 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+import file_actions as fa
+from benchmarks import synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--poles', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = os.path.join(tmp, 'nodes.xlsx')
+        synthetic.write_workbook(workbook, args.poles)
+        file = fa.read_and_normalize(workbook)
+        lines = file.loc[file['Owner'] == 'Verizon', 'Make Ready Notes'].str.count('\n').add(1).sum()
+        print(f'{args.poles} poles, {int(lines)} Verizon make ready lines')
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fa.verizon_app(file.copy(), tmp, 'bench', use_api=False)
+            timings.append(time.perf_counter() - start)
+        print(f'verizon_app: best {min(timings):.2f}s of {args.repeat}')
+
+
+if __name__ == '__main__':
+    main()
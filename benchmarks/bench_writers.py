@@ -0,0 +1,90 @@
+"""
+Compares write time and peak memory of the Excel writer backends on an MRN-sized export.
+
+    python -m benchmarks.bench_writers --poles 50000
+
+Every measurement runs in a fresh process so peak RSS is not polluted by earlier runs.
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from benchmarks import synthetic
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _sheets(input_path):
+    import file_actions as fa
+    import make_ready
+    file = fa.read_and_normalize(input_path)
+    return {'Sheet1': file[['SCID', 'Tag', 'Latitude', 'Longitude', 'Make Ready Notes']],
+            'Attachments': make_ready.parse_notes(file)}
+
+
+def _to_excel(sheets, output_path):
+    import pandas
+    with pandas.ExcelWriter(output_path, engine='openpyxl') as writer:
+        for sheet_name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=sheet_name, index=False)
+
+
+def _measure(backend, input_path, output_path, results):
+    import writers
+    sheets = _sheets(input_path)
+    # Peak RSS before writing, so the write's share can be told apart from loading the input
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else float('nan')
+    start = time.perf_counter()
+    if backend == 'to_excel':
+        _to_excel(sheets, output_path)
+    elif backend in ('csv', 'parquet'):
+        writers.write_side_outputs(output_path, sheets, (backend,))
+    else:
+        writers.write_excel(output_path, sheets, engine=backend)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else float('nan')
+    results.put((elapsed, before, peak, sum(len(frame) for frame in sheets.values())))
+
+
+def run(label, backend, input_path, output_path):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(backend, input_path, output_path, results))
+    process.start()
+    elapsed, before, peak, rows = results.get()
+    process.join()
+    print(f'{label:<42} {elapsed:8.2f}s {peak:8.0f} MiB peak RSS (+{peak - before:.0f} MiB writing {rows} rows)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--poles', type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'nodes.csv')
+        # Generate in a child too: peak RSS carries over from the parent into spawned processes
+        writer = multiprocessing.get_context('spawn').Process(target=synthetic.write_workbook,
+                                                              args=(input_path, args.poles))
+        writer.start()
+        writer.join()
+        print(f'{args.poles} poles')
+        output_path = os.path.join(tmp, 'out.xlsx')
+        run('DataFrame.to_excel (openpyxl)', 'to_excel', input_path, output_path)
+        run('writers, openpyxl write-only', 'openpyxl', input_path, output_path)
+        try:
+            import xlsxwriter  # noqa: F401
+            run('writers, xlsxwriter constant_memory', 'xlsxwriter', input_path, output_path)
+        except ImportError:
+            print('xlsxwriter not installed, skipping xlsxwriter')
+        run('writers, csv side output', 'csv', input_path, output_path)
+        run('writers, parquet side output', 'parquet', input_path, output_path)
+
+
+if __name__ == '__main__':
+    main()
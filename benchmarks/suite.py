@@ -0,0 +1,146 @@
+"""
+Times every stage of an export on synthetic Katapult data at several sizes and saves the results as JSON, so runs
+from different commits can be compared.
+
+    python -m benchmarks.suite                          # 1k, 10k and 100k poles
+    python -m benchmarks.suite --sizes 1000 10000 --output results/today.json
+    python -m benchmarks.suite --sizes 10000 --compare results/last-release.json
+
+With --compare, stages that got slower than --threshold times the previous result are listed and the exit code
+is 1, so the suite can gate CI.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import synthetic
+
+# Bump when the generated data changes, results of different generator versions aren't comparable
+GENERATOR_VERSION = 2
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _stages(input_path, output_path):
+    """(stage name, callable) pairs, in the order the app runs them. Later stages use earlier results."""
+    import file_actions as fa
+    import make_ready
+    import spatial
+    state = {}
+
+    def load():
+        state['file'] = fa.read_and_normalize(input_path)
+
+    def parse():
+        state['attachments'] = make_ready.parse_notes(state['file'])
+
+    def index():
+        # Once per job, like jobs.JobRunner does; the exporters then reuse the columns
+        state['file'] = spatial.with_pole_columns(state['file'])
+
+    return [
+        ('read_and_normalize', load),
+        ('combine_tags', lambda: fa.combine_tags(state['file'])),
+        ('parse_notes', parse),
+        ('spatial', index),
+        ('vetro_export', lambda: fa.vetro_export(state['file'], output_path, 'bench')),
+        ('generate_mrn', lambda: fa.generate_mrn(state['file'], output_path, 'bench',
+                                                 attachments=state['attachments'])),
+        ('verizon_app', lambda: fa.verizon_app(state['file'], output_path, 'bench', use_api=False,
+                                               attachments=state['attachments'])),
+        ('frontier_pdf', lambda: fa.frontier_pdf(state['file'], output_path, 'bench', per_pole=False)),
+    ]
+
+
+def run_size(poles: int, repeat: int, seed: int, skip: set) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'nodes.xlsx')
+        synthetic.write_workbook(input_path, poles, seed=seed, malformed_rate=0.01)
+        for stage, function in _stages(input_path, tmp):
+            if stage in skip:
+                continue
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                ok = function()
+                timings.append(time.perf_counter() - start)
+                # Exporters report failure instead of raising; a failed export isn't a valid timing
+                if ok is False:
+                    raise RuntimeError(f'{stage} failed at {poles} poles, see {tmp}/error.log')
+            results.append({'poles': poles, 'stage': stage, 'seconds': round(min(timings), 4),
+                            'runs': [round(timing, 4) for timing in timings]})
+            print(f'{poles:>8} poles  {stage:<20} {min(timings):9.3f}s', flush=True)
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import numpy
+    import pandas
+    return {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'generator_version': GENERATOR_VERSION, 'python': platform.python_version(),
+            'pandas': pandas.__version__, 'numpy': numpy.__version__, 'platform': platform.platform(),
+            'cpus': os.cpu_count()}
+
+
+def compare(results: list[dict], previous: dict, threshold: float) -> list[str]:
+    """Messages for every stage that is more than `threshold` times slower than in `previous`."""
+    before = {(result['poles'], result['stage']): result['seconds'] for result in previous['results']}
+    regressions = []
+    for result in results:
+        old = before.get((result['poles'], result['stage']))
+        # Sub-10ms stages are mostly noise
+        if old and max(result['seconds'], old) >= 0.01 and result['seconds'] > old * threshold:
+            regressions.append(f"{result['stage']} at {result['poles']} poles: {old:.3f}s -> "
+                               f"{result['seconds']:.3f}s ({result['seconds'] / old:.2f}x)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip', nargs='+', default=[], help='Stages to leave out, e.g. frontier_pdf')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier results file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args()
+
+    report = {'environment': environment(), 'results': []}
+    for poles in args.sizes:
+        report['results'] += run_size(poles, args.repeat, args.seed, set(args.skip))
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"{report['environment']['timestamp'].replace(':', '-')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if previous['environment'].get('generator_version') != GENERATOR_VERSION:
+            print('Previous results used another generator version, not comparing')
+            return 0
+        regressions = compare(report['results'], previous, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+        print(f"No stage more than {args.threshold}x slower than {previous['environment'].get('commit')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
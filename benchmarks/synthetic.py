@@ -0,0 +1,93 @@
+import numpy
+import pandas
+
+# Raw Katapult pole_owner spellings and how often each appears
+OWNER_MIX = {
+    'PPL Company': 0.45,
+    'Verizon Pennsylvania Inc.': 0.3,
+    'Frontier Communications - Lakewood': 0.15,
+    'UGI Utilities - Gas': 0.05,
+    'Service Electric Cablevision': 0.05,
+}
+STREETS = ['Main St', 'Church St', 'N Vine St', 'Wyoming Ave', 'Hollow Rd', 'State Route 93']
+TOWNS = ['Hazleton', 'West Hazleton', 'Hazle Township', 'Freeland', 'Conyngham']
+NOTE_COMPANIES = ['Verizon Pennsylvania Inc.', 'Comcast', 'Service Electric Company',
+                  'CTSI, LLC, Dba Frontier Communications']
+# Mistakes seen in hand-typed notes: bad inches, a move without an amount, text that isn't a height
+MALFORMED_LINES = ['{company}: Com at 23-14 Raise 6', '{company}: Strand at 21-3 Lower',
+                   '{company}: Com at 2O-6 Attach']
+
+
+def _note(rng: numpy.random.Generator, malformed_rate: float = 0.0) -> str:
+    lines = []
+    height = int(rng.integers(22, 26)) * 12 + int(rng.integers(0, 12))
+    for company in rng.choice(NOTE_COMPANIES, size=int(rng.integers(1, 4)), replace=False):
+        if rng.random() < malformed_rate:
+            lines.append(rng.choice(MALFORMED_LINES).format(company=company))
+            continue
+        height -= int(rng.integers(6, 20))
+        action = rng.choice(['Raise', 'Lower', 'Attach'], p=[0.4, 0.2, 0.4])
+        delta = f' {int(rng.integers(2, 13))}' if action != 'Attach' else ''
+        kind = rng.choice(['Com', 'Strand', 'Guy'], p=[0.6, 0.3, 0.1])
+        # Company names are matched case-insensitively
+        company = company.upper() if rng.random() < 0.05 else company
+        lines.append(f'{company}: {kind} at {height // 12}-{height % 12} {action}{delta}')
+    proposed = height - 12
+    lines.append(f'Loop Telecom Pennsylvania LLC: Proposed Strand at {proposed // 12}-{proposed % 12} Attach')
+    # Some notes are typed with blank lines between the attachers
+    return ('\n\n' if rng.random() < 0.1 else '\n').join(lines)
+
+
+def node_attributes(poles: int, seed: int = 0, extra_columns: int = 0, owner_mix: dict = None,
+                    tag_gap_rate: float = 0.1, note_rate: float = 0.95,
+                    malformed_rate: float = 0.0) -> pandas.DataFrame:
+    """
+    Builds a Katapult-like node attribute table with the raw (lowercase) column names Katapult exports.
+
+    Args:
+        extra_columns: Adds that many unused attribute columns, like the hundreds a full Katapult export carries.
+        owner_mix: Raw pole_owner spelling to share of poles, OWNER_MIX by default. Shares are normalized.
+        tag_gap_rate: Share of poles whose PPL tag is 'NT' or blank; the Verizon and pole tags have gaps at half that
+            rate, so some poles have no tag at all.
+        note_rate: Share of poles with make ready notes, the rest weren't surveyed.
+        malformed_rate: Share of note lines with a malformed height or amount.
+    """
+    rng = numpy.random.default_rng(seed)
+    owner_mix = owner_mix or OWNER_MIX
+    shares = numpy.array(list(owner_mix.values()), dtype=float)
+    scid = numpy.arange(1, poles + 1).astype(str)
+    # A few reference poles, which carry a letter in their SCID
+    scid = numpy.where(rng.random(poles) < 0.02, numpy.char.add(scid, '.A'), scid)
+    tags = rng.integers(10000, 99999, size=(3, poles)).astype(str)
+    gaps = rng.random((3, poles)) < numpy.array([[tag_gap_rate], [tag_gap_rate / 2], [tag_gap_rate / 2]])
+    owners = rng.choice(list(owner_mix), size=poles, p=shares / shares.sum())
+    file = pandas.DataFrame({
+        'latitude': 40.95 + rng.random(poles) * 0.1,
+        'longitude': -76.0 + rng.random(poles) * 0.1,
+        'scid': scid,
+        'node_type': 'pole',
+        'ppl company_tag': numpy.where(gaps[0], rng.choice(['NT', ''], size=poles), tags[0]),
+        'pole_owner': owners,
+        'verizon pennsylvania inc._tag': numpy.where(gaps[1], '', tags[1]),
+        'pole_tag': numpy.where(gaps[2], '', tags[2]),
+        'unknown_tag': '',
+        'make_ready_notes': [_note(rng, malformed_rate) if rng.random() < note_rate else None for _ in range(poles)],
+        'address': [f'{rng.integers(1, 999)} {rng.choice(STREETS)}, {rng.choice(TOWNS)}, PA 18201, USA'
+                    for _ in range(poles)],
+        'commonwealth telephone co.  dba frontier comm._tag': tags[1],
+        'county': 'Luzerne',
+    })
+    if extra_columns:
+        extra = rng.integers(0, 1000, size=(poles, extra_columns)).astype(str)
+        file = pandas.concat([file, pandas.DataFrame(extra, columns=[f'attribute_{i}' for i in range(extra_columns)])],
+                             axis=1)
+    return file
+
+
+def write_workbook(file_path, poles: int, seed: int = 0, extra_columns: int = 0, **options):
+    """Writes `node_attributes` as .xlsx, or as .csv if the path ends in .csv. Options go to node_attributes."""
+    file = node_attributes(poles, seed, extra_columns, **options)
+    if str(file_path).lower().endswith('.csv'):
+        file.to_csv(file_path, index=False)
+    else:
+        file.to_excel(file_path, index=False)
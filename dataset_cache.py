@@ -0,0 +1,79 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import file_actions as fa
+import owners
+import instrumentation
+import paths
+
+# Bump when read_and_normalize changes what it produces, so older cached frames are never reused
+NORMALIZE_VERSION = 5
+MAX_ENTRIES = 20
+
+
+def rules_version() -> str:
+    """Fingerprint of everything besides the input file that shapes the normalized frame."""
+    rules = json.dumps({'version': NORMALIZE_VERSION, 'headers': fa.HEADERS_TO_CHECK,
+                        'owners': owners.load_rules().rules(),
+                        'tags': [fa.TAG_PRECEDENCE, fa.MISSING_TAGS], 'address': fa.ADDRESS_PATTERN},
+                       sort_keys=True)
+    return hashlib.sha256(rules.encode()).hexdigest()[:16]
+
+
+def cache_key(file_path) -> str:
+    """Content hash + mtime of the source file + the rules version."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(str(os.stat(file_path).st_mtime_ns).encode())
+    digest.update(rules_version().encode())
+    return digest.hexdigest()[:32]
+
+
+def cache_dir() -> str:
+    path = os.path.join(paths.user_cache_dir(), 'normalized')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@instrumentation.timed('load')
+def load_normalized(file_path, directory: str = None, progress=None):
+    """
+    Returns `fa.read_and_normalize(file_path)`, parsing the source only the first time. The normalized frame is
+    kept as a Feather file and memory-mapped on later calls; a changed input or changed rules gives a new key, so
+    stale entries are never read. Without pyarrow this is just read_and_normalize. `progress` is passed on to it.
+    """
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        return fa.read_and_normalize(file_path, progress=progress)
+
+    directory = directory or cache_dir()
+    cached = os.path.join(directory, f'{cache_key(file_path)}.feather')
+    if os.path.isfile(cached):
+        try:
+            file = feather.read_table(cached, memory_map=True).to_pandas()
+            os.utime(cached)  # Keeps pruning least-recently-used
+            instrumentation.record(cache='hit')
+            return file
+        except Exception:  # Truncated or unreadable entry, rebuild it
+            os.remove(cached)
+
+    instrumentation.record(cache='miss')
+    file = fa.read_and_normalize(file_path, progress=progress)
+    try:
+        paths.write_atomic(cached, functools.partial(feather.write_feather, file))
+        _prune(directory)
+    except Exception:  # A frame Arrow can't store is still usable, it just isn't cached
+        pass
+    return file
+
+
+def _prune(directory: str):
+    """Keeps the MAX_ENTRIES most recently used frames."""
+    entries = sorted(glob.glob(os.path.join(directory, '*.feather')), key=os.path.getmtime, reverse=True)
+    for entry in entries[MAX_ENTRIES:]:
+        os.remove(entry)
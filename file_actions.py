@@ -1,59 +1,123 @@
 import pandas
-import re
 import os
-import math
-import pypdf
+import numpy
 import datetime
-from geopy.geocoders import Nominatim
-
-def read_and_normalize(file_path) -> pandas.DataFrame:
-    file = pandas.read_excel(file_path)
-    headers_list = file.columns.tolist()
-    found_headers_to_check = ['latitude', 'longitude', 'scid', 'node_type', 'ppl company_tag', 'pole_owner',
-                              'verizon pennsylvania inc._tag', 'pole_tag', 'unknown_tag', 'make_ready_notes', 'address',
-                              'commonwealth telephone co.  dba frontier comm._tag', 'county']
-    found_headers = [header for header in found_headers_to_check if header in headers_list]
+import instrumentation
+import make_ready
+import owners
+import spatial
+import heights
+import writers
+
+# Katapult node attribute columns the exporters use, everything else in the export is never loaded
+HEADERS_TO_CHECK = ['latitude', 'longitude', 'scid', 'node_type', 'ppl company_tag', 'pole_owner',
+                    'verizon pennsylvania inc._tag', 'pole_tag', 'unknown_tag', 'make_ready_notes', 'address',
+                    'commonwealth telephone co.  dba frontier comm._tag', 'county']
+# SCIDs and tags must stay text so leading zeros and letters survive
+HEADER_DTYPES = {header: str for header in HEADERS_TO_CHECK if header not in ('latitude', 'longitude')}
+HEADER_DTYPES.update({'latitude': float, 'longitude': float})
+# The dtype pandas' own readers give a dtype=str column, which the streaming reader matches
+TEXT_DTYPE = pandas.Series([], dtype=str).dtype
+
+# Tag columns in the order they are trusted. A blank or 'NT' (no tag) value falls through to the next column.
+TAG_PRECEDENCE = ['ppl company_tag', 'verizon pennsylvania inc._tag', 'pole_tag', 'unknown_tag']
+MISSING_TAGS = ['', 'NT']
+# Rows between progress events while reading a workbook row by row
+PROGRESS_ROWS = 5000
+
+# Katapult addresses read like "123 Main St, Hazleton, PA 18201, USA", sometimes after a place name
+# ("Sheetz, 12 Church St, ...") or without a house number. Parsed from the end, so the state and zip anchor the
+# municipality and street before them.
+ADDRESS_PATTERN = (r'^\s*(?:(?P<place>[^,]+?),\s*)?'
+                   r'(?:(?P<house_number>\d+[A-Za-z]?(?:-\d+[A-Za-z]?)?)\s+)?(?P<street>[^,]+?),\s*'
+                   r'(?P<municipality>[^,]+?),\s*(?P<state>[A-Z]{2})(?:\s+(?P<zip>\d{5}(?:-\d{4})?))?'
+                   r'(?:,\s*(?:USA|United States))?\s*$')
+ADDRESS_COLUMNS = {'house_number': 'House Number', 'street': 'Street', 'municipality': 'Address Municipality',
+                   'state': 'State', 'zip': 'Zip'}
+
+
+def excel_engine() -> str:
+    """Prefers the Rust calamine reader when python-calamine is installed, otherwise streams with openpyxl."""
+    try:
+        import python_calamine  # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return 'openpyxl'
+
+
+def read_xlsx_streaming(file_path, progress=None) -> pandas.DataFrame:
+    """
+    Reads only the needed columns of the first sheet with openpyxl's read-only mode, row by row, without building
+    the rest of the sheet. `progress` is called as progress('Rows read', done, total) every PROGRESS_ROWS rows.
+    """
+    import openpyxl
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header_row = next(rows, ())
+        wanted = [(i, header) for i, header in enumerate(header_row) if header in HEADERS_TO_CHECK]
+        if not wanted:
+            return pandas.DataFrame()
+        # Stop parsing each row after the last needed column
+        rows = workbook.worksheets[0].iter_rows(min_row=2, max_col=wanted[-1][0] + 1, values_only=True)
+        # The sheet's declared dimensions, 0 (no total) when the workbook doesn't record them
+        total = max((workbook.worksheets[0].max_row or 1) - 1, 0)
+        columns = {header: [] for _, header in wanted}
+        for done, row in enumerate(rows, start=1):
+            for i, header in wanted:
+                columns[header].append(row[i] if i < len(row) else None)
+            if progress and done % PROGRESS_ROWS == 0:
+                progress('Rows read', done, max(total, done))
+    finally:
+        workbook.close()
+
+    file = pandas.DataFrame(columns)
+    for header in file.columns:
+        if HEADER_DTYPES[header] is float:
+            file[header] = pandas.to_numeric(file[header], errors='coerce').astype(float)
+        else:
+            # Same as read_csv/read_excel with dtype=str: text, NaN for blanks, even when the whole column is blank
+            values = file[header].astype(object)
+            missing = values.isna()
+            file[header] = values.where(missing, values.astype(str)).mask(missing, numpy.nan).astype(TEXT_DTYPE)
+    return file
+
+
+@instrumentation.timed('read_and_normalize')
+def read_and_normalize(file_path, progress=None) -> pandas.DataFrame:
+    """
+    Reads a Katapult export and normalizes it. `progress`, if given, is called as progress(message, done, total)
+    between steps (and while rows are read, for streamed workbooks), so a job can show and cancel the load.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.csv':  # Katapult CSV export
+        file = pandas.read_csv(file_path, usecols=lambda header: header in HEADERS_TO_CHECK, dtype=HEADER_DTYPES)
+    elif extension == '.xlsx' and excel_engine() == 'openpyxl':
+        file = read_xlsx_streaming(file_path, progress=progress)
+    else:
+        # Without calamine, .xls goes to pandas' default reader (xlrd); openpyxl only reads .xlsx
+        engine = excel_engine()
+        file = pandas.read_excel(file_path, usecols=lambda header: header in HEADERS_TO_CHECK, dtype=HEADER_DTYPES,
+                                 engine=engine if engine == 'calamine' else None)
+    found_headers = [header for header in HEADERS_TO_CHECK if header in file.columns]
     file = file[found_headers]
+    if progress:
+        progress('Normalizing owners, tags and addresses', len(file), len(file))
 
-    replacements = {
-        'PPL Company': 'PPL',
-        'Verizon Pennsylvania Inc.': 'Verizon',
-        'Frontier Communications of PA. - New Holland': 'Frontier',
-        'Frontier Communications of PA. - New Holland Telecom': 'Frontier',
-        'Frontier Communications - Lakewood': 'Frontier',
-        'Frontier Communications - Lakewood Telecom': 'Frontier',
-        'Commonwealth Telephone Co.  dba Frontier Comm.': 'Frontier',
-        'Commonwealth Telephone Co.  dba Frontier Comm. Telecom': 'Frontier',
-        'Loop Telecom Pennsylvania LLC': 'Loop Internet',
-        'UGI Utilities - Electric Division': 'UGI',
-        'UGI Utilities - Gas': 'UGI',
-        'UGI PENN NATURAL GAS, INC': 'UGI',
-        'Service Electric Cablevision Inc - Mahanoy City': 'Service Electric',
-        'Service Electric Cablevision': 'Service Electric',
-        'Service Electric Cable TV Inc.': 'Service Electric',
-        'Service Electric Company - Wilkes-Barre': 'Service Electric',
-        'Upper Oxford Twp, Chester Co.': 'Xfinity',
-        'City of Scranton - Wireless': 'City of Scranton',
-        'City of Scranton': 'City of Scranton',
-        'City of Scranton Office of Economic & Community Development': 'City of Scranton',
-        'CTSI, LLC, dba Frontier Communications': 'CTSI'
-    }
-
-    # Modify owner column
-    pole_owners = file['pole_owner'].tolist()
-    for i, value in enumerate(pole_owners):
-        if value in replacements:
-            pole_owners[i] = replacements[value]
-        else:
-            pole_owners[i] = 'Surveyed / Unknown Owner'
-    file['pole_owner'] = pole_owners
+    # Owner names come from the rules file; spellings no rule matches are kept in attrs for the job's summary
+    file['pole_owner'], unmatched = owners.load_rules().normalize(file['pole_owner'])
+    file.attrs['unmatched_owners'] = unmatched.to_dict()
+
+    # The raw PPL tag stays as its own column, the Verizon application needs it as the ELCO pole number
+    file.insert(file.columns.get_loc('pole_owner'), 'Tag', combine_tags(file))
+    if 'address' in file.columns:
+        file = pandas.concat([file, parse_addresses(file['address'])], axis=1)
 
     file.rename(columns={
         'latitude': 'Latitude',
         'longitude': 'Longitude',
         'scid': 'SCID',
         'node_type': 'Pole Type',
-        'ppl company_tag': 'Tag',
         'pole_owner': 'Owner',
         'make_ready_notes': 'Make Ready Notes'
     }, inplace=True)
@@ -61,414 +125,287 @@ def read_and_normalize(file_path) -> pandas.DataFrame:
     return file
 
 
-def combine_tags(file) -> pandas.DataFrame:
-    # Modify tag column
-    tags_list = ['verizon pennsylvania inc._tag', 'pole_tag', 'unknown_tag']
-    tag_variables = {}
-    for tag in tags_list:
-        if tag not in file.columns.tolist():
-            tags_list.remove(tag)
-        else:
-            tag_variables[tag] = file[tag].tolist()
-    tag_final = file['Tag'].tolist()
-    for i, tag in enumerate(tag_final):
-        if tag == '' or tag == 'NT':
-            temp_comp = []
-            for x in tag_variables:
-                temp_comp.append(str(tag_variables[x][i]))
-            tag_final[i] = max(temp_comp)
-    file['Tag'] = tag_final
-    return file
-
-
-def vetro_export(file: pandas.DataFrame, path, name) -> bool:
+@instrumentation.timed('combine_tags')
+def combine_tags(file) -> pandas.Series:
+    """Resolves each pole's tag: the first tag column in TAG_PRECEDENCE that has a real tag, NA if none does."""
+    tag = pandas.Series(pandas.NA, index=file.index, dtype='string')
+    for column in TAG_PRECEDENCE:
+        if column in file.columns:
+            candidates = file[column].astype('string').str.strip()
+            tag = tag.fillna(candidates.mask(candidates.isin(MISSING_TAGS)))
+    return tag
+
+
+@instrumentation.timed('parse_addresses')
+def parse_addresses(addresses: pandas.Series) -> pandas.DataFrame:
+    """
+    Splits the address column into the ADDRESS_COLUMNS in one pass. Address Parsed is False for blank addresses and
+    ones that don't fit ADDRESS_PATTERN; their parts are NA, so exporters leave them blank instead of failing.
+    """
+    parts = addresses.astype('string').str.extract(ADDRESS_PATTERN)
+    parts = parts[list(ADDRESS_COLUMNS)].rename(columns=ADDRESS_COLUMNS).apply(lambda column: column.str.strip())
+    parts['Address Parsed'] = parts['Street'].notna()
+    instrumentation.record(unparsed=int((~parts['Address Parsed']).sum()))
+    return parts
+
+
+@instrumentation.timed('vetro_export')
+def vetro_export(file: pandas.DataFrame, path, name, progress=None, side_outputs=()) -> bool:
     try:
-        file = combine_tags(file)
+        file = spatial.with_pole_columns(file)
         # Rename columns for Vetro import
-        file[['Latitude', 'Longitude', 'SCID', 'Pole Type', 'Tag', 'Owner']].to_excel(f'{path}/{name}-Vetro-data.xlsx', index=False)
+        columns = ['Latitude', 'Longitude', 'SCID', 'Pole Type', 'Tag', 'Owner'] + spatial.COLUMNS
+        writers.write(f'{path}/{name}-Vetro-data.xlsx', {'Sheet1': file[columns]}, side_outputs=side_outputs,
+                      progress=progress)
+        if progress:
+            progress('Files written', 1, 1)
         return True
-    except Exception as e:
-        with open(f'{path}/error.log', 'a+') as f:
-            f.write(str(e))
+    except Exception:
+        instrumentation.log_exception(path, 'Vetro export')
         return False
 
 
-def generate_mrn(file: pandas.DataFrame, path, name) -> bool:
+@instrumentation.timed('generate_mrn')
+def generate_mrn(file: pandas.DataFrame, path, name, attachments: pandas.DataFrame = None, progress=None,
+                 side_outputs=()) -> bool:
     try:
-        file = combine_tags(file)
-        # MRN Data Sheet
-        file[['SCID', 'Tag', 'Latitude', 'Longitude', 'Make Ready Notes']].to_excel(f'{path}/{name}-MRN-data.xlsx', index=False)
+        if attachments is None:
+            attachments = make_ready.parse_notes(file)
+        below_loop = make_ready.below_loop(make_ready.AttachmentIndex(attachments, file.index))
+        below_loop = below_loop.assign(**{column: heights.to_feet_inches(below_loop[column])
+                                          for column in below_loop.columns if 'Height' in column})
+        # MRN Data Sheet, plus the parsed attachment lines for checking the notes at a glance
+        attachments = attachments.assign(**{
+            'Existing Height': heights.to_feet_inches(attachments['Existing Height']),
+            'New Height': heights.to_feet_inches(attachments['New Height'])
+        }).drop(columns=['Line'])
+        file = spatial.with_pole_columns(file)
+        writers.write(f'{path}/{name}-MRN-data.xlsx', {
+            'Sheet1': file[['SCID', 'Tag', 'Latitude', 'Longitude', 'Make Ready Notes'] + spatial.COLUMNS],
+            'Attachments': attachments,
+            'Below Loop': below_loop
+        }, side_outputs=side_outputs, progress=progress)
+        if progress:
+            progress('Files written', 1, 1)
         return True
-    except Exception as e:
-        with open(f'{path}/error.log', 'a+') as f:
-            f.write(str(e))
+    except Exception:
+        instrumentation.log_exception(path, 'Make ready notes export')
         return False
 
 
-def verizon_app(file: pandas.DataFrame, path, name, use_api) -> bool:
-
-    def split_and_convert(target: str) -> int:
-        if not target or not isinstance(target, str):
-            raise ValueError("Input must be a non-empty string")
-        try:
-            parts = target.split('-')
-            if len(parts) != 2:
-                raise ValueError("Input must be in format 'feet-inches'")
-            feet = int(parts[0])
-            inches = int(parts[1])
-            if inches < 0 or inches >= 12:
-                raise ValueError("Inches must be between 0 and 11")
-            if feet < 0:
-                raise ValueError("Feet cannot be negative")
-            return (feet * 12) + inches
-        except ValueError:
-            raise ValueError
-
-    def get_street_name(address: str) -> str:
-        return address.split(', ')[0].split(' ', maxsplit=1)[1]
-
-    def get_municipality(latlon: str) -> str:
-        location = locator.reverse(latlon, exactly_one=True)
-        address_details = location.raw['address']
-        m = address_details.get('municipality') or address_details.get('city') or address_details.get(
-            'town') or address_details.get('village')
-        return m
+def reference_poles(scid: pandas.Series) -> pandas.Series:
+    """True for reference poles: their SCID has something other than digits (e.g. 4.A), real poles are numbered."""
+    return ~scid.astype(str).str.isdigit()
+
+
+def verizon_poles(file: pandas.DataFrame, attachments: pandas.DataFrame) -> numpy.ndarray:
+    """Positional mask of the poles verizon_app looks up a municipality for: Verizon owned, not a reference pole
+    and with at least one valid make ready line."""
+    valid = attachments.index[attachments['Error'].isna().to_numpy()]
+    return ((file['Owner'] == 'Verizon') & ~reference_poles(file['SCID']) & file.index.isin(valid)).to_numpy()
+
+
+@instrumentation.timed('verizon_app')
+def verizon_app(file: pandas.DataFrame, path, name, use_api, attachments: pandas.DataFrame = None,
+                progress=None, side_outputs=(), workers: int = None) -> bool:
 
     try:
-        file = file.loc[file['Owner'] == 'Verizon', ['Latitude', 'Longitude', 'SCID', 'Owner', 'Tag', 'verizon pennsylvania inc._tag',
-                                                     'Make Ready Notes', 'address']]
-
-        # Create a new dataframe
-        columns_mrs = {
-            'Pole Ref #': [],
-            'Telco Pole #': [],
-            'ELCO Pole #': [],
-            'Route/Line (Verizon Use Only)': [],
-            'Street Name': [],
-            'Attacher Company': [],
-            'Attachment Type': [],
-            'Action': [],
-            'Existing Height': [],
-            'New Height': [],
-            'Quantity': [],
-            'Municipality': []
-        }
-        columns_info = {
-            'Pole Ref #': [],
-            'Telco Pole #': [],
-            'ELCO Pole #': [],
-            'Route/Line (Verizon Use Only)': [],
-            'Street Name': [],
-            'Attachment Description': [],
-            'Number of Attachments': [],
-            'Attachment Height': [],
-            'Billing Description (Verizon Use Only)': [],
-            'Fs/Rs OR Quad': [],
-            'Comments': [],
-            'Municipality': []
-        }
-        columns_details = {
-            'Pole Ref #': [],
-            'MR Req': [],
-            'Telco Pole #': [],
-            'ELCO Pole #': [],
-            'Route/Line (Verizon Use Only)': [],
-            'Street Name': [],
-            'Cross Street Name': [],
-            'Location Description': [],
-            'Latitude': [],
-            'Longitude': [],
-            'Height': [],
-            'Class': [],
-            'Exclude from Application (Verizon Use Only)': [],
-            'Not Owned or Controlled by VZ (Verizon Use Only)': [],
-            'Customer Already Attached': [],
-            'Pole OTMR Qualified Y/N (Verizon Use Only)': [],
-            'If No, Reason Why (Verizon Use Only)': [],
-            'Municipality': []
-        }
-        verizonmmrs = pandas.DataFrame(columns_mrs)
-        verizoninfo = pandas.DataFrame(columns_info)
-        verizondetails = pandas.DataFrame(columns_details)
+        # A Municipality column comes from the job resolving them up front (see manifest.py)
+        file = file.loc[file['Owner'] == 'Verizon', ['Latitude', 'Longitude', 'SCID', 'Owner', 'ppl company_tag', 'verizon pennsylvania inc._tag',
+                                                     'Make Ready Notes', 'Street', 'Address Municipality']
+                        + (['Municipality'] if 'Municipality' in file.columns else [])]
+        if attachments is None:
+            attachments = make_ready.parse_notes(file)
+
+        # Column layout of each output sheet
+        columns_mrs = ['Pole Ref #', 'Telco Pole #', 'ELCO Pole #', 'Route/Line (Verizon Use Only)', 'Street Name',
+                       'Attacher Company', 'Attachment Type', 'Action', 'Existing Height', 'New Height', 'Quantity',
+                       'Municipality']
+        columns_info = ['Pole Ref #', 'Telco Pole #', 'ELCO Pole #', 'Route/Line (Verizon Use Only)', 'Street Name',
+                        'Attachment Description', 'Number of Attachments', 'Attachment Height',
+                        'Billing Description (Verizon Use Only)', 'Fs/Rs OR Quad', 'Comments', 'Municipality']
+        columns_details = ['Pole Ref #', 'MR Req', 'Telco Pole #', 'ELCO Pole #', 'Route/Line (Verizon Use Only)',
+                           'Street Name', 'Cross Street Name', 'Location Description', 'Latitude', 'Longitude',
+                           'Height', 'Class', 'Exclude from Application (Verizon Use Only)',
+                           'Not Owned or Controlled by VZ (Verizon Use Only)', 'Customer Already Attached',
+                           'Pole OTMR Qualified Y/N (Verizon Use Only)', 'If No, Reason Why (Verizon Use Only)',
+                           'Municipality']
 
         # Declare variables for information refactorization
-        hardware = ['Guy', 'Com', 'Strand']
-        action_check = ['Attach', 'Raise', 'Lower']
-        companies = {
-            'Verizon Pennsylvania Inc.': 'VERIZON WIRELESS(AERIAL)',
-            'CTSI, LLC, Dba Frontier Communications': 'FRONTIER COMMUNICATIONS',
-            'Loop Telecom Pennsylvania LLC': 'LOOP INTERNET HOLDCO LLC',
-            'Comcast': 'COMCAST',
-            'Service Electric Company': 'SERVICE ELECTRIC CABLE TV'
-        }
         actions = {
             'Raise': 'Raise',
             'Lower': 'Lower',
             'Attach': 'No Make Ready'
         }
-        attachments = {
+        attachment_types = {
             'Com': 'Cable/Strand',
             'Guy': 'Down Guy',
             'Strand': 'Cable/Strand',
         }
-        file.reset_index(drop=True, inplace=True)
-        mrn_iterable = file['Make Ready Notes'].tolist()
-
-        # Declare variables for table input
-        attacher_company = None
-        attachment_type = None
-        action = None
-        existing_height = None
-        new_height = None
-
-        # Begin refactoring data
-        for x, value in enumerate(mrn_iterable):
-            if not file.loc[x, 'SCID'].isdigit():  # Skip pole if SCID contains a letter because it is a reference pole
-                continue
-            if pandas.isna(value) or not isinstance(value, str):  # Check for NaN/float values
-                new_row_data = {
-                    'Pole Ref #': file.loc[x, 'SCID'],
-                    'Telco Pole #': file.loc[x, 'verizon pennsylvania inc._tag'],
-                    'ELCO Pole #': file.loc[x, 'Tag'],
-                    'Attacher Company': 'Not Surveyed',
-                    'Attachment Type': 'n/a',
-                    'Action': 'n/a',
-                    'Existing Height': 'n/a',
-                    'New Height': 'n/a',
-                    'Quantity': 'n/a',
-                    'Municipality': 'n/a'
-                }
-                # Add the new row to the DataFrame using .loc
-                verizonmmrs.loc[len(verizonmmrs)] = new_row_data
-                continue  # Move to the next instruction
-            lines = re.split('\n+', value)
-            for line in lines:
-                company_found = False
-                for comp in companies:
-                    comp_match_obj = re.match(comp, line, re.IGNORECASE)
-                    if comp_match_obj:
-                        attacher_company = companies[comp_match_obj.group()]
-                        line = line[comp_match_obj.end():]
-                        company_found = True
-                        break  # Exit the loop once a company is found
-                if not company_found:
-                    continue  # Skip to the next line if no company was matched
-                if not any(re.search(item, line, re.IGNORECASE) for item in hardware):
-                    continue
-                if not any(re.search(act, line, re.IGNORECASE) for act in action_check):
-                    continue
-                punctuation_marks = r'[:"\'.;]'
-                line = re.sub(punctuation_marks, '', line)
-                iterable_line = line.split(' ')
-                for i, word in enumerate(iterable_line):
-                    if word == 'at':
-                        attachment_type = iterable_line[i - 1]
-                        existing_height = iterable_line[i + 1]
-                        action = iterable_line[i + 2]
-                        # Perform calculations if needed for a new height
-                        if action == 'Raise':
-                            change = iterable_line[i + 3]
-                            new_height = split_and_convert(existing_height) + int(change)
-                            new_height = new_height / 12
-                            fraction, whole = math.modf(new_height)
-                            first, second = existing_height.split('-')
-                            existing_height = f'''{first}'-{second}"'''
-                            new_height = f'''{int(whole)}'-{int(fraction * 12)}"'''
-                            break
-                        elif action == 'Lower':
-                            change = iterable_line[i + 3]
-                            new_height = split_and_convert(existing_height) - int(change)
-                            new_height = new_height / 12
-                            fraction, whole = math.modf(new_height)
-                            first, second = existing_height.split('-')
-                            existing_height = f'''{first}'-{second}"'''
-                            new_height = f'''{int(whole)}'-{int(fraction * 12)}"'''
-                            break
-                        else:
-                            first, second = existing_height.split('-', maxsplit=1)
-                            existing_height = f'''{first}'-{second}"'''
-                            new_height = existing_height
-                            break
-
-                # Format attachment type
-                attachment_type = attachments[attachment_type]
-                # Format action
-                action = actions[str(action)]
-
-                if use_api:
-                    locator = Nominatim(user_agent="PoleRework", timeout=100)
-
-                    new_row_data_mrs = {
-                        'Pole Ref #': file.loc[x, 'SCID'],
-                        'Telco Pole #': file.loc[x, 'verizon pennsylvania inc._tag'],
-                        'ELCO Pole #': file.loc[x, 'Tag'],
-                        'Attacher Company': attacher_company,
-                        'Attachment Type': attachment_type,
-                        'Action': action,
-                        'Existing Height': existing_height,
-                        'New Height': new_height,
-                        'Quantity': '1',
-                        'Municipality': get_municipality(f'{file.loc[x, 'Latitude']}, {file.loc[x, 'Longitude']}')
-                    }
-                    verizonmmrs.loc[len(verizonmmrs)] = new_row_data_mrs
-
-                    new_row_data_info = {
-                        'Pole Ref #': new_row_data_mrs['Pole Ref #'],
-                        'Telco Pole #': new_row_data_mrs['Telco Pole #'],
-                        'ELCO Pole #': new_row_data_mrs['ELCO Pole #'],
-                        'Attachment Description': attachment_type,
-                        'Attachment Height': new_height,
-                        'Municipality': new_row_data_mrs['Municipality']
-                    }
-                    if attacher_company == 'LOOP INTERNET HOLDCO LLC':
-                        verizoninfo.loc[len(verizoninfo)] = new_row_data_info
-
-                    new_row_data_details = {
-                        'Pole Ref #': new_row_data_mrs['Pole Ref #'],
-                        'Telco Pole #': new_row_data_mrs['Telco Pole #'],
-                        'ELCO Pole #': new_row_data_mrs['ELCO Pole #'],
-                        'Street Name': get_street_name(file.loc[x, 'address']),
-                        'Latitude': file.loc[x, 'Latitude'],
-                        'Longitude': file.loc[x, 'Longitude'],
-                        'Municipality': new_row_data_mrs['Municipality']
-                    }
-                    if not verizondetails['Pole Ref #'].isin([file.loc[x, 'SCID']]).any() and attacher_company == 'LOOP INTERNET HOLDCO LLC':
-                        verizondetails.loc[len(verizondetails)] = new_row_data_details
-                else:
-                    new_row_data_mrs = {
-                        'Pole Ref #': file.loc[x, 'SCID'],
-                        'Telco Pole #': file.loc[x, 'verizon pennsylvania inc._tag'],
-                        'ELCO Pole #': file.loc[x, 'Tag'],
-                        'Attacher Company': attacher_company,
-                        'Attachment Type': attachment_type,
-                        'Action': action,
-                        'Existing Height': existing_height,
-                        'New Height': new_height,
-                        'Quantity': '1'
-                    }
-                    verizonmmrs.loc[len(verizonmmrs)] = new_row_data_mrs
-
-                    new_row_data_info = {
-                        'Pole Ref #': new_row_data_mrs['Pole Ref #'],
-                        'Telco Pole #': new_row_data_mrs['Telco Pole #'],
-                        'ELCO Pole #': new_row_data_mrs['ELCO Pole #'],
-                        'Attachment Description': attachment_type,
-                        'Attachment Height': new_height
-                    }
-                    if attacher_company == 'LOOP INTERNET HOLDCO LLC':
-                        verizoninfo.loc[len(verizoninfo)] = new_row_data_info
-
-                    new_row_data_details = {
-                        'Pole Ref #': new_row_data_mrs['Pole Ref #'],
-                        'Telco Pole #': new_row_data_mrs['Telco Pole #'],
-                        'ELCO Pole #': new_row_data_mrs['ELCO Pole #'],
-                        'Street Name': get_street_name(file.loc[x, 'address']),
-                        'Latitude': file.loc[x, 'Latitude'],
-                        'Longitude': file.loc[x, 'Longitude'],
-                    }
-                    if not verizondetails['Pole Ref #'].isin(
-                            [file.loc[x, 'SCID']]).any() and attacher_company == 'LOOP INTERNET HOLDCO LLC':
-                        verizondetails.loc[len(verizondetails)] = new_row_data_details
-
-                verizoninfo['Attachment Description'] = verizoninfo['Attachment Description'].replace('Down Guy', 'Anchor')
+
+        file = file[~reference_poles(file['SCID'])]
+        attachments = attachments[attachments.index.isin(file.index)]
+        # Bad heights are logged per line and left out instead of failing the whole export
+        make_ready.report_errors(attachments, path)
+        attachments = attachments[attachments['Error'].isna().to_numpy()]
+        attachments = attachments.iloc[numpy.lexsort((attachments['Line'].to_numpy(),
+                                                      file.index.get_indexer(attachments.index)))]
+        poles = file.loc[attachments.index]
+
+        if use_api and 'Municipality' in file.columns:
+            line_municipalities = poles['Municipality'].to_numpy()
+        elif use_api:
+            import geocoding  # Only API mode needs the boundary/geocoder stack
+            # The address names most poles' municipality; the rest are resolved in one batched pass instead of a
+            # Nominatim call per note line
+            has_lines = file.index.isin(attachments.index)
+            municipalities = file.loc[has_lines, 'Address Municipality'].astype(object)
+            unknown = municipalities.isna().to_numpy()
+            if unknown.any():
+                municipalities[unknown] = geocoding.resolve_municipalities(
+                    file.loc[has_lines, 'Latitude'][unknown], file.loc[has_lines, 'Longitude'][unknown],
+                    resolver=geocoding.load_resolver(), progress=progress)
+            line_municipalities = municipalities.loc[attachments.index].to_numpy()
+        else:
+            line_municipalities = None
+
+        # Poles without notes (NaN/float values) get a single placeholder row
+        not_surveyed = file[~file['Make Ready Notes'].map(lambda v: isinstance(v, str))]
+        not_surveyed_rows = pandas.DataFrame({
+            'Pole Ref #': not_surveyed['SCID'],
+            'Telco Pole #': not_surveyed['verizon pennsylvania inc._tag'],
+            'ELCO Pole #': not_surveyed['ppl company_tag'],
+            'Attacher Company': 'Not Surveyed',
+            'Attachment Type': 'n/a',
+            'Action': 'n/a',
+            'Existing Height': 'n/a',
+            'New Height': 'n/a',
+            'Quantity': 'n/a',
+            'Municipality': 'n/a',
+            'Line': 0
+        }, index=not_surveyed.index)
+        line_rows = pandas.DataFrame({
+            'Pole Ref #': attachments['SCID'],
+            'Telco Pole #': poles['verizon pennsylvania inc._tag'].to_numpy(),
+            'ELCO Pole #': poles['ppl company_tag'].to_numpy(),
+            'Attacher Company': attachments['Company'],
+            'Attachment Type': attachments['Attachment Type'].map(attachment_types),
+            'Action': attachments['Action'].map(actions),
+            'Existing Height': heights.to_feet_inches(attachments['Existing Height']),
+            'New Height': heights.to_feet_inches(attachments['New Height']),
+            'Quantity': '1',
+            'Municipality': line_municipalities,
+            'Line': attachments['Line']
+        }, index=attachments.index)
+
+        # Keep the rows in pole order, then in note line order
+        verizonmmrs = pandas.concat([not_surveyed_rows, line_rows])
+        order = numpy.lexsort((verizonmmrs['Line'].to_numpy(), file.index.get_indexer(verizonmmrs.index)))
+        verizonmmrs = verizonmmrs.iloc[order].reset_index(drop=True).reindex(columns=columns_mrs)
+
+        loop_lines = (attachments['Company'] == make_ready.LOOP).to_numpy()
+        loop_rows = line_rows[loop_lines]
+        loop_poles = poles[loop_lines]
+        verizoninfo = pandas.DataFrame({
+            'Pole Ref #': loop_rows['Pole Ref #'],
+            'Telco Pole #': loop_rows['Telco Pole #'],
+            'ELCO Pole #': loop_rows['ELCO Pole #'],
+            'Attachment Description': loop_rows['Attachment Type'].replace('Down Guy', 'Anchor'),
+            'Attachment Height': loop_rows['New Height'],
+            'Municipality': loop_rows['Municipality']
+        }).reset_index(drop=True).reindex(columns=columns_info)
+        # Only one details row per pole
+        verizondetails = pandas.DataFrame({
+            'Pole Ref #': loop_rows['Pole Ref #'],
+            'Telco Pole #': loop_rows['Telco Pole #'],
+            'ELCO Pole #': loop_rows['ELCO Pole #'],
+            'Street Name': loop_poles['Street'],
+            'Latitude': loop_poles['Latitude'],
+            'Longitude': loop_poles['Longitude'],
+            'Municipality': loop_rows['Municipality']
+        }).drop_duplicates(subset='Pole Ref #').reset_index(drop=True).reindex(columns=columns_details)
 
         if use_api:
-            municipalities = verizonmmrs['Municipality'].unique()
-            # Check for municipalities
-            for municipality in municipalities:
-                print(f"Processing data for {municipality}...")
-
-                mmrs_filtered = verizonmmrs[verizonmmrs['Municipality'] == municipality]
-                ids_for_municipality = mmrs_filtered['Pole Ref #'].unique()
-                info_filtered = verizoninfo[verizoninfo['Pole Ref #'].isin(ids_for_municipality)]
-                details_filtered = verizondetails[verizondetails['Pole Ref #'].isin(ids_for_municipality)]
-
-                # 4. Define the output filename using the municipality's name
-                output_filename = f'{path}/{name}-{municipality}-verizon-MRS.xlsx'
-
-                # 5. Write the filtered DataFrames to a new Excel file
-                with pandas.ExcelWriter(output_filename, engine='openpyxl') as writer:
-                    # Before writing, drop the 'Municipality' column as requested
-                    mmrs_output = mmrs_filtered.drop(columns=['Municipality'])
-                    info_output = info_filtered.drop(columns=['Municipality'])
-                    details_output = details_filtered.drop(columns=['Municipality'])
-
-                    mmrs_output.to_excel(writer, sheet_name='Make Ready', index=False)
-                    info_output.to_excel(writer, sheet_name='Attachment Info', index=False)
-                    details_output.to_excel(writer, sheet_name='Pole Details', index=False)
+            # Split all three sheets by municipality in one groupby pass each, poles the lookup couldn't place
+            # go to an 'Unknown' workbook
+            sheets = {'Make Ready': verizonmmrs, 'Attachment Info': verizoninfo, 'Pole Details': verizondetails}
+            groups = {sheet: frame.groupby(frame['Municipality'].fillna('Unknown'), sort=False).indices
+                      for sheet, frame in sheets.items()}
+            workbooks, used_names = {}, set()
+            for municipality in groups['Make Ready']:
+                # Distinct municipalities could sanitize to the same name
+                filename = base = writers.safe_filename(municipality)
+                suffix = 2
+                while filename.lower() in used_names:
+                    filename, suffix = f'{base} ({suffix})', suffix + 1
+                used_names.add(filename.lower())
+                workbooks[f'{path}/{name}-{filename}-verizon-MRS.xlsx'] = {
+                    sheet: frame.iloc[groups[sheet].get(municipality, [])].drop(columns=['Municipality'])
+                    for sheet, frame in sheets.items()
+                }
+            # Each municipality's workbook is written in its own process
+            writers.write_many(workbooks, side_outputs=side_outputs, workers=workers, progress=progress)
             return True
         else:
-            with pandas.ExcelWriter(f'{path}/{name}-verizon-MRS.xlsx', engine='openpyxl') as writer:
-                verizonmmrs.to_excel(writer, sheet_name='Make Ready', index=False)
-                verizoninfo.to_excel(writer, sheet_name='Attachment Info', index=False)
-                verizondetails.to_excel(writer, sheet_name='Pole Details', index=False)
+            writers.write(f'{path}/{name}-verizon-MRS.xlsx', {
+                'Make Ready': verizonmmrs,
+                'Attachment Info': verizoninfo,
+                'Pole Details': verizondetails
+            }, side_outputs=side_outputs, progress=progress)
+            if progress:
+                progress('Files written', 1, 1)
             return True
 
-    except Exception as e:
-        with open(f'{path}/error.log', 'a+') as f:
-            f.write(str(e))
+    except Exception:
+        instrumentation.log_exception(path, 'Verizon application')
         return False
 
 
-def frontier_pdf(file: pandas.DataFrame, path, name) -> bool:
-
-    def gen_table_data(parent_file: pandas.DataFrame, limit: int, start: int = 0) -> dict:
-        all_pole_data = {}
-        for i in range(limit):
-            # Format address for route num and street name
-            i += start
-            address = parent_file.loc[i, 'address']
-            address = address.split(', ')
-            for part in address:
-                if re.search(r'\d', part):
-                    break
-                else:
-                    address.remove(part)
-                    break
-            municipality = address[1]
-            address = address[0]
-            address = address.split(' ', maxsplit=1)
-            route, street = address[0], address[1]
-            pole_data = {
-                f'Telephone Co Pole Row{i + 1 - start}': parent_file.loc[i, 'commonwealth telephone co.  dba frontier comm._tag'],
-                f'Power Pole Row{i + 1 - start}': 'dk',
-                f'Street  LocationRow{i + 1 - start}': street,  # Two spaces here because Frontier is retarded
-                f'Route NumberRow{i + 1 - start}': route,
-                f'MunicipalityRow{i + 1 - start}': municipality,
-                f'CountyRow{i + 1 - start}': parent_file.loc[i, 'county']
-            }
-            pole_identifier = {f'Pole ID {i}': pole_data}
-            all_pole_data.update(pole_identifier)
-        return all_pole_data
-
-    file = file.loc[file['Owner'] == 'Frontier', ['Latitude', 'Longitude', 'SCID', 'Owner', 'Tag', 'Make Ready Notes', 'address', 'county', 'commonwealth telephone co.  dba frontier comm._tag']]
+def frontier_groups(file: pandas.DataFrame, path, name, date: str, per_pole: bool = True, size: int = 20):
+    """
+    Lazily yields one (form values, output paths, pole count) tuple per group of `size` Frontier poles. Field values
+    come from column arrays instead of a .loc lookup per field.
+    """
+    tags = file['commonwealth telephone co.  dba frontier comm._tag'].to_numpy()
+    counties = file['county'].to_numpy()
+    # Unparsed addresses leave the route, street and municipality blank
+    routes = file['House Number'].to_numpy(dtype=object, na_value=None)
+    streets = file['Street'].to_numpy(dtype=object, na_value=None)
+    municipalities = file['Address Municipality'].to_numpy(dtype=object, na_value=None)
+    for count, start in enumerate(range(0, len(file), size), start=1):
+        group = f'Group{count}'
+        values = {'Date': date}
+        targets = []
+        for row, i in enumerate(range(start, min(start + size, len(file))), start=1):
+            values.update({
+                f'Telephone Co Pole Row{row}': tags[i],
+                f'Power Pole Row{row}': 'dk',
+                f'Street  LocationRow{row}': streets[i],  # Two spaces here because Frontier is retarded
+                f'Route NumberRow{row}': routes[i],
+                f'MunicipalityRow{row}': municipalities[i],
+                f'CountyRow{row}': counties[i]
+            })
+            # Every pole in a group gets the same application, so the same bytes are written once per pole
+            if per_pole:
+                targets.append(f"{path}/{name}/{group}/{tags[i]}-frontier_form.pdf")
+        if not per_pole:
+            targets.append(f"{path}/{name}/{group}/{group}-frontier_form.pdf")
+        yield values, targets, min(size, len(file) - start)
+
+
+@instrumentation.timed('frontier_pdf')
+def frontier_pdf(file: pandas.DataFrame, path, name, progress=None, per_pole: bool = True,
+                 merged: bool = False, workers: int = None) -> bool:
+    file = file.loc[file['Owner'] == 'Frontier', ['Latitude', 'Longitude', 'SCID', 'Owner', 'Tag', 'Make Ready Notes',
+                                                  'House Number', 'Street', 'Address Municipality', 'county',
+                                                  'commonwealth telephone co.  dba frontier comm._tag']]
     file.reset_index(drop=True, inplace=True)
     date = datetime.datetime.now().strftime("%m/%d/%Y")
-    poles_count = len(file['SCID'].tolist())
-
-    # Create file structure and variable groups
-    index, count = 0, 1
-    groups = {}
-    while poles_count > 0:
-        poles_count -= 20
-        groups[f'Group{count}'] = gen_table_data(file, poles_count + 20 if poles_count < 0 else 20, start=index)
-        index += 20
-        count += 1
-
-    with pypdf.PdfReader('pdf/template.pdf') as reader:
-        for group, poleID in groups.items():
-            data_combined = {}
-            for _, pole in poleID.items():
-                data_combined.update(pole)
-            for _, pole in poleID.items():
-                reader_copy = reader  # Creates a copy of PDF to not overwrite the original PDF when new data is added
-                output_path = f"{path}/{name}/{group}/{next(iter(pole.values()))}-frontier_form.pdf"
-                writer = pypdf.PdfWriter()
-                writer.clone_reader_document_root(reader_copy)
-                writer.update_page_form_field_values(writer.pages[0], {'Date': date})
-                os.makedirs(f"{path}/{name}/{group}", exist_ok=True)
-                writer.update_page_form_field_values(writer.pages[0], data_combined)
-                with open(output_path, "wb") as output_file:
-                    writer.write(output_file)
+
+    import pdf_forms  # pypdf is only loaded once a Frontier export runs
+    # Groups of 20 poles are built lazily and filled in a pool of renderer processes as they come
+    pdf_forms.render_groups(frontier_groups(file, path, name, date, per_pole=per_pole), workers=workers,
+                            merged_path=f"{path}/{name}-frontier-applications.pdf" if merged else None,
+                            progress=progress, total=len(file))
 
     return True
@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+import time
+import paths
+
+
+class GeocodeCache:
+    """
+    Persistent SQLite cache of reverse-geocoded municipalities keyed by quantized coordinates.
+
+    Coordinates are rounded to `precision` decimal places (4 is roughly 11 m), so repeat runs and neighbouring
+    poles on the same street share entries. Entries expire after `ttl_days` and the least recently used ones are
+    dropped once the table grows past `max_entries`.
+    """
+
+    def __init__(self, db_path: str = None, precision: int = 4, ttl_days: float = 180,
+                 max_entries: int = 200_000):
+        self.db_path = db_path or os.path.join(paths.user_cache_dir(), 'geocode.sqlite')
+        self.precision = precision
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode (
+                lat_key INTEGER NOT NULL,
+                lon_key INTEGER NOT NULL,
+                municipality TEXT,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (lat_key, lon_key)
+            )""")
+        self._conn.execute('CREATE INDEX IF NOT EXISTS geocode_last_used ON geocode (last_used)')
+        self._conn.commit()
+        self.evict()
+
+    def key(self, lat: float, lon: float) -> tuple[int, int]:
+        scale = 10 ** self.precision
+        return round(float(lat) * scale), round(float(lon) * scale)
+
+    def get_many(self, coordinates) -> dict:
+        """
+        Looks up many (lat, lon) pairs at once.
+
+        Returns:
+            A dict of the pairs that were found, mapped to their cached municipality (which may be None).
+        """
+        now = time.time()
+        keys = {coord: self.key(*coord) for coord in coordinates}
+        found = {}
+        with self._lock:
+            for coord, (lat_key, lon_key) in keys.items():
+                row = self._conn.execute(
+                    'SELECT municipality FROM geocode WHERE lat_key = ? AND lon_key = ? AND created >= ?',
+                    (lat_key, lon_key, now - self.ttl)).fetchone()
+                if row is not None:
+                    found[coord] = row[0]
+            self._conn.executemany('UPDATE geocode SET last_used = ? WHERE lat_key = ? AND lon_key = ?',
+                                   [(now, *keys[coord]) for coord in found])
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, lat: float, lon: float, default=None):
+        return self.get_many([(lat, lon)]).get((lat, lon), default)
+
+    def put_many(self, results: dict):
+        """Stores a {(lat, lon): municipality} mapping, evicting old entries if the cache is full."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO geocode (lat_key, lon_key, municipality, created, last_used) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(*self.key(*coord), municipality, now, now) for coord, municipality in results.items()])
+            self._conn.commit()
+        self.evict()
+
+    def put(self, lat: float, lon: float, municipality):
+        self.put_many({(lat, lon): municipality})
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones above `max_entries`."""
+        with self._lock:
+            self._conn.execute('DELETE FROM geocode WHERE created < ?', (time.time() - self.ttl,))
+            self._conn.execute("""
+                DELETE FROM geocode WHERE rowid IN (
+                    SELECT rowid FROM geocode ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+
+
+def default_cache() -> GeocodeCache:
+    """The cache shared by every export in this process."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = GeocodeCache()
+    return _default_cache
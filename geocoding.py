@@ -0,0 +1,296 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy
+import pandas
+import geocache
+import instrumentation
+import paths
+
+# Municipal boundary polygons used to resolve poles offline. Any GeoJSON/shapefile with one feature per
+# municipality works (e.g. the PennDOT municipal boundaries layer from PASDA). It isn't shipped with the app: put it
+# in geo/ in the source folder, or next to main.exe in a packaged install.
+BOUNDARIES_PATH = paths.resource_path(os.path.join('geo', 'municipalities.geojson'))
+NAME_FIELDS = ('MUNICIPAL1', 'MUNICIPAL_NAME', 'MUNI_NAME', 'NAME', 'name', 'Name')
+
+# Online fallback provider. The public Nominatim usage policy allows at most 1 request per second; a self-hosted
+# instance can be pointed to with NOMINATIM_DOMAIN/NOMINATIM_SCHEME and given a higher rate.
+NOMINATIM_DOMAIN = os.environ.get('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+NOMINATIM_SCHEME = os.environ.get('NOMINATIM_SCHEME', 'https')
+PUBLIC_NOMINATIM_RATE = 1.0
+SELF_HOSTED_RATE = float(os.environ.get('NOMINATIM_RATE', 10.0))
+
+
+def _ring_edges(rings: list) -> numpy.ndarray:
+    """Stacks every ring of a polygon into one (4, n) array of x1, y1, x2, y2 edge coordinates."""
+    edges = []
+    for ring in rings:
+        ring = numpy.asarray(ring, dtype=float)[:, :2]
+        edges.append(numpy.hstack([ring, numpy.roll(ring, -1, axis=0)]))
+    return numpy.vstack(edges).T
+
+
+def _points_in_polygon(edges: numpy.ndarray, x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    """
+    Even-odd ray casting for many points against one polygon. Holes are handled for free because
+    their edges are part of the same edge list.
+    """
+    x1, y1, x2, y2 = edges
+    inside = numpy.zeros(len(x), dtype=bool)
+    # Keep the (points x edges) matrix at a few million cells so huge polygons don't blow up memory
+    chunk = max(1, 2_000_000 // max(1, len(x1)))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, len(x), chunk):
+            px = x[start:start + chunk, None]
+            py = y[start:start + chunk, None]
+            crosses = (y1 > py) != (y2 > py)
+            x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside[start:start + chunk] = numpy.count_nonzero(crosses & (px < x_cross), axis=1) % 2 == 1
+    return inside
+
+
+class MunicipalityResolver:
+    """
+    Point-in-polygon municipality lookup backed by a uniform grid index over polygon bounding boxes.
+    """
+
+    def __init__(self, features: list[tuple[str, list]], cell_size: float = 0.05):
+        """
+        Args:
+            features: (municipality name, list of rings) pairs. A ring is a sequence of (lon, lat) points.
+            cell_size: Grid cell size in degrees.
+        """
+        self.cell_size = cell_size
+        self.names = []
+        self.edges = []
+        self.grid = {}
+        for name, rings in features:
+            if not rings:
+                continue
+            edges = _ring_edges(rings)
+            feature_id = len(self.names)
+            self.names.append(name)
+            self.edges.append(edges)
+            # Register the feature in every grid cell its bounding box touches
+            min_x, max_x = numpy.floor(numpy.array([edges[0].min(), edges[0].max()]) / cell_size).astype(int)
+            min_y, max_y = numpy.floor(numpy.array([edges[1].min(), edges[1].max()]) / cell_size).astype(int)
+            for cx in range(min_x, max_x + 1):
+                for cy in range(min_y, max_y + 1):
+                    self.grid.setdefault((cx, cy), []).append(feature_id)
+
+    @classmethod
+    def from_file(cls, file_path, name_field: str = None, cell_size: float = 0.05) -> 'MunicipalityResolver':
+        """Loads municipal boundaries from a GeoJSON file or, if pyshp is installed, a shapefile."""
+        if os.path.splitext(file_path)[1].lower() == '.shp':
+            import shapefile  # Optional dependency, only needed for shapefiles
+            with shapefile.Reader(file_path) as shp:
+                records = [(rec.as_dict(), rec.shape.__geo_interface__) for rec in shp.iterShapeRecords()]
+        else:
+            with open(file_path, encoding='utf-8') as f:
+                collection = json.load(f)
+            records = [(feat.get('properties') or {}, feat.get('geometry')) for feat in collection['features']]
+
+        features = []
+        for properties, geometry in records:
+            if not geometry:
+                continue
+            field = name_field or next((key for key in NAME_FIELDS if key in properties), None)
+            name = properties.get(field) if field else None
+            if geometry['type'] == 'Polygon':
+                rings = list(geometry['coordinates'])
+            elif geometry['type'] == 'MultiPolygon':
+                rings = [ring for polygon in geometry['coordinates'] for ring in polygon]
+            else:
+                continue
+            features.append((name, rings))
+        return cls(features, cell_size=cell_size)
+
+    def resolve(self, latitudes, longitudes) -> numpy.ndarray:
+        """
+        Resolves every coordinate pair in one batched pass.
+
+        Returns:
+            An object array of municipality names, with None for points outside every polygon.
+        """
+        lat = numpy.asarray(latitudes, dtype=float)
+        lon = numpy.asarray(longitudes, dtype=float)
+        result = numpy.full(len(lat), None, dtype=object)
+        valid = ~(numpy.isnan(lat) | numpy.isnan(lon))
+        if not valid.any():
+            return result
+
+        # Bucket points by grid cell so each polygon is only tested against nearby points
+        index = numpy.flatnonzero(valid)
+        cells = numpy.floor(numpy.column_stack([lon[index], lat[index]]) / self.cell_size).astype(int)
+        unique_cells, inverse = numpy.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = numpy.argsort(inverse, kind='stable')
+        bounds = numpy.searchsorted(inverse[order], numpy.arange(len(unique_cells) + 1))
+
+        for c, (cx, cy) in enumerate(unique_cells):
+            candidates = self.grid.get((int(cx), int(cy)))
+            if not candidates:
+                continue
+            points = index[order[bounds[c]:bounds[c + 1]]]
+            for feature_id in candidates:
+                if len(points) == 0:
+                    break
+                inside = _points_in_polygon(self.edges[feature_id], lon[points], lat[points])
+                result[points[inside]] = self.names[feature_id]
+                points = points[~inside]
+        return result
+
+
+_loaded = {}
+_warned_missing = set()
+
+
+def load_resolver(file_path=BOUNDARIES_PATH):
+    """
+    Returns a resolver for the bundled boundary file, or None when no boundaries are available. The boundaries are
+    parsed again only when the file changes, so a long-running process (see watch_folder.py) reads them once.
+    """
+    if not file_path or not os.path.isfile(file_path):
+        if file_path and file_path not in _warned_missing:
+            _warned_missing.add(file_path)
+            print(f'Municipal boundaries {file_path} not found, every municipality will be looked up online',
+                  file=sys.stderr)
+        return None
+    key = (file_path, os.stat(file_path).st_mtime_ns)
+    if key not in _loaded:
+        _loaded.clear()
+        _loaded[key] = MunicipalityResolver.from_file(file_path)
+    return _loaded[key]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire` blocks until a token is available, so no more than `rate` calls per second
+    (with bursts of up to `capacity`) get through across all threads.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def nominatim_municipality(locator, lat: float, lon: float):
+    location = locator.reverse(f'{lat}, {lon}', exactly_one=True)
+    if location is None:
+        return None
+    address_details = location.raw['address']
+    return (address_details.get('municipality') or address_details.get('city') or address_details.get('town')
+            or address_details.get('village'))
+
+
+def _reverse_with_retry(locator, limiter: TokenBucket, lat: float, lon: float, retries: int, backoff: float):
+    from geopy.exc import GeocoderRateLimited, GeocoderServiceError
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return nominatim_municipality(locator, lat, lon)
+        except GeocoderServiceError as e:  # Timeouts, 5xx and 429s all derive from this
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            if isinstance(e, GeocoderRateLimited) and e.retry_after:
+                delay = max(delay, e.retry_after)
+            time.sleep(delay)
+
+
+def geocode_coordinates(coordinates, domain: str = None, scheme: str = None, rate: float = None, workers: int = 4,
+                        retries: int = 3, backoff: float = 1.0, results: dict = None, progress=None) -> dict:
+    """
+    Reverse geocodes unique (lat, lon) pairs through a thread pool sharing one token-bucket rate limit.
+
+    Args:
+        coordinates: Unique (lat, lon) pairs to resolve.
+        domain: Nominatim host, defaults to NOMINATIM_DOMAIN. Point this at a local stub server for testing.
+        scheme: 'http' or 'https', defaults to NOMINATIM_SCHEME.
+        rate: Requests per second. Defaults to 1 for public Nominatim and SELF_HOSTED_RATE otherwise.
+        workers: Number of concurrent requests.
+        retries: Retries per coordinate on timeouts, rate limiting and server errors, with exponential backoff.
+        backoff: Base delay in seconds for the first retry.
+        results: Optional dict to fill in place, so completed lookups survive a failure part way through.
+        progress: Optional callback, called as progress(message, done, total) after every lookup.
+
+    Returns:
+        A dict mapping each pair to its municipality (None if Nominatim has no answer).
+    """
+    from geopy.geocoders import Nominatim
+    domain = domain or NOMINATIM_DOMAIN
+    scheme = scheme or NOMINATIM_SCHEME
+    if rate is None:
+        rate = PUBLIC_NOMINATIM_RATE if domain == 'nominatim.openstreetmap.org' else SELF_HOSTED_RATE
+    locator = Nominatim(user_agent="PoleRework", timeout=100, domain=domain, scheme=scheme)
+    limiter = TokenBucket(rate)
+    results = {} if results is None else results
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(_reverse_with_retry, locator, limiter, lat, lon, retries, backoff): (lat, lon)
+                   for lat, lon in coordinates}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            if progress:
+                progress('Geocoding poles', done, len(futures))
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return results
+
+
+@instrumentation.timed('geocoding')
+def resolve_municipalities(latitudes: pandas.Series, longitudes: pandas.Series, resolver=None,
+                           use_fallback: bool = True, cache: geocache.GeocodeCache = None,
+                           **geocode_options) -> pandas.Series:
+    """
+    Resolves a whole Latitude/Longitude column pair to municipality names. Points are matched against the
+    boundary polygons first; points outside every polygon are looked up in the persistent geocode cache and only
+    then sent to Nominatim, once per quantized coordinate. Extra keyword arguments go to `geocode_coordinates`.
+    """
+    result = pandas.Series(resolver.resolve(latitudes, longitudes) if resolver else None,
+                           index=latitudes.index, dtype=object)
+    missing = result.isna() & latitudes.notna() & longitudes.notna()
+    instrumentation.record(polygon_hits=int(result.notna().sum()))
+    if use_fallback and missing.any():
+        cache = cache if cache is not None else geocache.default_cache()
+        coordinates = list(dict.fromkeys(zip(latitudes[missing], longitudes[missing])))
+        lookups = cache.get_many(coordinates)
+        instrumentation.record(cache_hits=len(lookups), cache_misses=len(coordinates) - len(lookups))
+        # One request per quantized key, the rest of the coordinates share its answer
+        pending = {}
+        for coord in coordinates:
+            if coord not in lookups:
+                pending.setdefault(cache.key(*coord), []).append(coord)
+        if pending:
+            instrumentation.record(requests=len(pending))
+            fetched = {}
+            try:
+                geocode_coordinates([coords[0] for coords in pending.values()], results=fetched, **geocode_options)
+            finally:
+                # Keep whatever was resolved before a failure so the next run doesn't ask again
+                fetched = {coord: fetched[coords[0]] for coords in pending.values() for coord in coords
+                           if coords[0] in fetched}
+                cache.put_many(fetched)
+            lookups.update(fetched)
+        result[missing] = [lookups[coord] for coord in zip(latitudes[missing], longitudes[missing])]
+    return result
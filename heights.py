@@ -0,0 +1,67 @@
+import pandas
+
+# Katapult writes heights as feet-inches, e.g. 23-4
+FEET_INCHES_PATTERN = r'^(?P<feet>-?\d+)-(?P<inches>\d+)$'
+# Feet-inches with a fractional part, e.g. 23-4.5, reported as such instead of as a bad format
+FRACTIONAL_PATTERN = r'^-?\d+(?:\.\d+)?-\d+(?:\.\d+)?$'
+
+
+def to_inches(heights: pandas.Series) -> tuple[pandas.Series, pandas.Series]:
+    """
+    Converts a Series of feet-inches strings ('23-4') to integer inches.
+
+    Returns:
+        (inches, errors): inches as a nullable Int64 Series, NA where the value is invalid, and a Series with a
+        message for every invalid value (NA for valid ones), so callers can report bad rows and carry on.
+    """
+    parts = heights.astype('string').str.strip().str.extract(FEET_INCHES_PATTERN)
+    feet = pandas.to_numeric(parts['feet']).astype('Int64')
+    inches = pandas.to_numeric(parts['inches']).astype('Int64')
+
+    errors = pandas.Series(pandas.NA, index=heights.index, dtype='string')
+    errors = errors.mask(inches.ge(12).fillna(False), 'inches must be between 0 and 11')
+    errors = errors.mask(feet.lt(0).fillna(False), 'feet cannot be negative')
+    errors = errors.mask(feet.isna(), "must be in format 'feet-inches'")
+    fractional = heights.astype('string').str.strip().str.fullmatch(FRACTIONAL_PATTERN).fillna(False)
+    errors = errors.mask(feet.isna() & fractional, 'feet and inches must be whole numbers')
+    errors = errors.where(errors.isna(), heights.astype('string') + ': ' + errors)
+    return (feet * 12 + inches).where(errors.isna()), errors
+
+
+def to_feet_inches(inches: pandas.Series) -> pandas.Series:
+    """Formats integer inches as feet-inches strings, e.g. 280 -> 23'-4". NA stays NA."""
+    inches = inches.astype('Int64')
+    return (inches // 12).astype('string') + "'-" + (inches % 12).astype('string') + '"'
+
+
+def to_amount(amounts: pandas.Series) -> tuple[pandas.Series, pandas.Series]:
+    """
+    Converts make ready amounts ('6') to integer inches.
+
+    Returns:
+        (inches, errors) like `to_inches`. Amounts that aren't a number, or aren't a whole number of inches
+        (e.g. '6.5'), are NA with a message; missing amounts are NA without one.
+    """
+    numbers = pandas.to_numeric(amounts, errors='coerce')
+    errors = pandas.Series(pandas.NA, index=amounts.index, dtype='string')
+    errors = errors.mask(numbers.isna() & amounts.notna(), 'amount must be a number of inches')
+    errors = errors.mask((numbers % 1 != 0) & numbers.notna(), 'amount must be a whole number of inches')
+    errors = errors.where(errors.isna(), amounts.astype('string') + ': ' + errors)
+    return numbers.where(errors.isna()).astype('Int64'), errors
+
+
+def apply_delta(inches: pandas.Series, delta: pandas.Series) -> tuple[pandas.Series, pandas.Series]:
+    """
+    Adds a signed inch delta to heights.
+
+    Returns:
+        (inches, errors) like `to_inches`, flagging results that would end up below the ground and deltas that
+        aren't a whole number of inches.
+    """
+    numbers = pandas.to_numeric(delta, errors='coerce')
+    fractional = ((numbers % 1 != 0) & numbers.notna()).to_numpy(dtype=bool)
+    result = inches.astype('Int64') + numbers.where(~fractional).astype('Int64')
+    errors = pandas.Series(pandas.NA, index=inches.index, dtype='string')
+    errors = errors.mask(result.lt(0).fillna(False), 'new height is below the ground')
+    errors = errors.mask(fractional, 'delta must be a whole number of inches')
+    return result.where(errors.isna()), errors
@@ -0,0 +1,234 @@
+import datetime
+import functools
+import os
+import platform
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+# The report stages are recorded into in this process, set by RunReport.activate()
+_active = None
+
+
+def _rss_mb():
+    """(current RSS, peak RSS) of this process in MiB, None where the platform doesn't say."""
+    try:
+        with open('/proc/self/status') as f:
+            status = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(status['VmRSS'].split()[0]) / 1024, int(status['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux but in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return None, peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return memory.rss / 1024 / 1024, getattr(memory, 'peak_wset', 0) / 1024 / 1024 or None
+    except ImportError:
+        return None, None
+
+
+def _reset_peak():
+    """Lets the next stage's peak be measured on its own. Linux only; elsewhere the peak is for the whole run."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+class Stage:
+    """One timed stage. Code running inside it can add counts with `set` (see instrumentation.record)."""
+
+    def __init__(self, name: str, path: str, rows_in: int = None):
+        self.name = name
+        self.path = path  # 'parent/child' for nested stages
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.details = {}
+        self.error = None
+        self.seconds = None
+        self.rss_mb = None
+        self.peak_rss_mb = None
+
+    def set(self, rows_out: int = None, **details):
+        if rows_out is not None:
+            self.rows_out = int(rows_out)
+        self.details.update(details)
+
+    def to_dict(self) -> dict:
+        return {'stage': self.path, 'seconds': self.seconds, 'rows_in': self.rows_in, 'rows_out': self.rows_out,
+                'rss_mb': self.rss_mb, 'peak_rss_mb': self.peak_rss_mb, 'details': self.details,
+                'error': self.error}
+
+
+class RunReport:
+    """
+    Collects a timing record per stage of a job (wall time, rows in/out, memory, stage-specific counts such as cache
+    hits) and writes them as one JSON run report. Exporters and helpers don't take the report as an argument: they
+    are wrapped with `timed` or open `stage(...)` blocks, which record into the active report and do nothing
+    otherwise.
+    """
+
+    def __init__(self, **job):
+        self.job = job
+        self.stages = []
+        self.started = datetime.datetime.now()
+        self.start = time.perf_counter()
+        self._stack = []
+
+    def activate(self):
+        global _active
+        _active = self
+        return self
+
+    def deactivate(self):
+        global _active
+        if _active is self:
+            _active = None
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None):
+        path = '/'.join([entry.name for entry in self._stack] + [name])
+        entry = Stage(name, path, None if rows_in is None else int(rows_in))
+        self._stack.append(entry)
+        self.stages.append(entry)
+        # Only top-level stages reset the peak, a nested stage's peak belongs to its parent too
+        if len(self._stack) == 1:
+            _reset_peak()
+        start = time.perf_counter()
+        try:
+            yield entry
+        except BaseException as e:
+            entry.error = entry.error or f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            entry.seconds = round(time.perf_counter() - start, 4)
+            rss, peak = _rss_mb()
+            entry.rss_mb = None if rss is None else round(rss, 1)
+            entry.peak_rss_mb = None if peak is None else round(peak, 1)
+            self._stack.pop()
+
+    def merge(self, stages: list[dict], parent: str = None):
+        """Adds stage records made in a worker process, under `parent`."""
+        for record in stages:
+            entry = Stage(record['stage'].rsplit('/', 1)[-1],
+                          f"{parent}/{record['stage']}" if parent else record['stage'], record['rows_in'])
+            entry.rows_out, entry.details, entry.error = record['rows_out'], record['details'], record['error']
+            entry.seconds, entry.rss_mb, entry.peak_rss_mb = record['seconds'], record['rss_mb'], record['peak_rss_mb']
+            self.stages.append(entry)
+
+    def to_dict(self, **summary) -> dict:
+        return {
+            'job': self.job,
+            'started': self.started.isoformat(timespec='seconds'),
+            'seconds': round(time.perf_counter() - self.start, 4),
+            **summary,
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpus': os.cpu_count(), 'pid': os.getpid()},
+            'stages': [entry.to_dict() for entry in self.stages],
+        }
+
+    def write(self, output_path, **summary):
+        import json
+        with open(output_path, 'w') as f:
+            json.dump(self.to_dict(**summary), f, indent=2, default=str)
+
+
+class _NoStage:
+    """Stand-in yielded by `stage` when no report is active."""
+
+    def set(self, rows_out: int = None, **details):
+        pass
+
+
+@contextmanager
+def stage(name: str, rows_in: int = None):
+    """Times the block as a stage of the active report, if there is one."""
+    if _active is None:
+        yield _NoStage()
+    else:
+        with _active.stage(name, rows_in) as entry:
+            yield entry
+
+
+def record(rows_out: int = None, **details):
+    """Adds counts to the innermost open stage of the active report."""
+    if _active is not None and _active._stack:
+        _active._stack[-1].set(rows_out, **details)
+
+
+def log_exception(path, where: str):
+    """
+    Appends the exception being handled to {path}/error.log with a timestamp, where it happened and the full
+    traceback, and marks the innermost open stage as failed.
+    """
+    error = sys.exc_info()[1]
+    if _active is not None and _active._stack:
+        _active._stack[-1].error = f'{type(error).__name__}: {error}'
+    with open(f'{path}/error.log', 'a+') as f:
+        f.write(f'[{datetime.datetime.now().isoformat(timespec="seconds")}] {where} failed: {error}\n')
+        f.write(traceback.format_exc())
+
+
+@contextmanager
+def profiled(profiler: str, output_stem: str):
+    """
+    Profiles the block with cProfile (written to {output_stem}-profile.prof, open it with snakeviz or pstats) or
+    pyinstrument (written to {output_stem}-profile.html). Yields the path the profile will be written to.
+    """
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+        profile_path = f'{output_stem}-profile.html'
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield profile_path
+        finally:
+            profiler.stop()
+            with open(profile_path, 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+    elif profiler == 'cprofile':
+        import cProfile
+        profile_path = f'{output_stem}-profile.prof'
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profile_path
+        finally:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+    else:
+        raise ValueError(f'Unknown profiler {profiler!r}, expected one of {PROFILERS}')
+
+
+def timed(name: str):
+    """
+    Decorator running the function as a stage of the active report. Rows in is the length of the first argument
+    and rows out the length of the result, where they have one; exporters' True/False becomes `success`.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            rows_in = len(args[0]) if args and hasattr(args[0], '__len__') and not isinstance(args[0], str) else None
+            with _active.stage(name, rows_in) as entry:
+                result = function(*args, **kwargs)
+                if isinstance(result, bool):
+                    entry.set(success=result)
+                elif hasattr(result, '__len__') and not isinstance(result, str) and entry.rows_out is None:
+                    entry.set(rows_out=len(result))
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,263 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import dataset_cache
+import file_actions as fa
+import instrumentation
+import manifest
+import owners
+import spatial
+
+# Each action gets the normalized file, the parsed make ready notes, the output folder/name, the options chosen in
+# the window or on the command line and a progress callback
+ACTIONS = {
+    "Prepare for Vetro": lambda file, attachments, path, name, options, progress: fa.vetro_export(
+        file, path, name, progress=progress, side_outputs=options.get('side_outputs', ())),
+    "Generate Make Ready Notes": lambda file, attachments, path, name, options, progress: fa.generate_mrn(
+        file, path, name, attachments=attachments, progress=progress, side_outputs=options.get('side_outputs', ())),
+    "Generate Verizon Application": lambda file, attachments, path, name, options, progress: fa.verizon_app(
+        file, path, name, use_api=options.get('use_api', False), attachments=attachments, progress=progress,
+        side_outputs=options.get('side_outputs', ()), workers=options.get('workers')),
+    "Generate Frontier Applications (Prototype)": lambda file, attachments, path, name, options, progress: fa.frontier_pdf(
+        file, path, name, progress=progress, workers=options.get('workers')),
+}
+# Actions that use the parsed make ready notes; the others don't need the notes parsed at all
+NOTES_ACTIONS = {'Generate Make Ready Notes', 'Generate Verizon Application'}
+
+
+class JobCancelled(BaseException):
+    """
+    Raised from a progress callback once the job is cancelled. It derives from BaseException so the exporters'
+    `except Exception` error logging doesn't swallow it.
+    """
+
+
+class Progress:
+    """
+    Progress callback handed to the exporters when they run on the job thread: `progress(message, done, total)`.
+    Each call posts an event for the window and is also the point where a cancelled job stops.
+    """
+
+    def __init__(self, job: 'JobRunner', step: int, steps: int):
+        self.job = job
+        self.step = step
+        self.steps = steps
+
+    def __call__(self, message: str, done: int = 0, total: int = 0):
+        if self.job.cancelled.is_set():
+            raise JobCancelled
+        fraction = (self.step + (done / total if total else 0)) / self.steps
+        text = f'{message} ({done}/{total})' if total else message
+        self.job.events.put(('progress', fraction, text))
+
+
+class WorkerProgress:
+    """Progress callback for an action running in a worker process; events go through a manager queue."""
+
+    def __init__(self, action: str, events, cancelled):
+        self.action = action
+        self.events = events
+        self.cancelled = cancelled
+
+    def __call__(self, message: str, done: int = 0, total: int = 0):
+        if self.cancelled.is_set():
+            raise JobCancelled
+        self.events.put((self.action, message, done, total))
+
+
+# The (file, attachments) snapshot each worker process unpickles once at start-up
+_shared = None
+
+
+def _init_worker(snapshot: bytes):
+    global _shared
+    _shared = pickle.loads(snapshot)
+
+
+def _run_action(action: str, path, name, options: dict, events, cancelled) -> tuple[bool, float, list[dict]]:
+    """Runs one action in a worker process. Its stages are recorded here and merged into the job's report."""
+    file, attachments = _shared
+    report = instrumentation.RunReport().activate()
+    start = time.perf_counter()
+    try:
+        ok = ACTIONS[action](file, attachments, path, name, options, WorkerProgress(action, events, cancelled))
+    except JobCancelled:
+        ok = None
+    finally:
+        report.deactivate()
+    return ok, time.perf_counter() - start, [entry.to_dict() for entry in report.stages]
+
+
+class JobRunner:
+    """
+    Runs the selected actions for one input file on a worker thread. The window polls `events` with `after()`;
+    events are tuples of ('progress', fraction, text), ('action', name, success, seconds) and finally
+    ('done', success) or ('cancelled',).
+
+    With `parallel` on and more than one action selected, the actions run side by side in a process pool. The
+    normalized frame is pickled once and every worker unpickles that same snapshot, so no action pays for another's
+    copy and total time approaches that of the slowest action.
+
+    Every run writes {name}-run-report.json to the output folder with the time, rows and memory of each stage
+    (see instrumentation.RunReport). With options['profile'] set to 'cprofile' or 'pyinstrument' the whole job is
+    also profiled, running everything in this process so the profile covers it.
+    """
+
+    def __init__(self, file_path, output_path, name, actions: list[str], options: dict = None,
+                 parallel: bool = True):
+        self.file_path = file_path
+        self.output_path = output_path
+        self.name = name
+        self.actions = [action for action in actions if action in ACTIONS]
+        self.options = options or {}
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        self.parallel = parallel
+        self.results = []  # {'action', 'success', 'seconds'} per finished action
+        self.success = None  # Set once the job finishes, None while running or if cancelled
+        self.error = None  # Message of the exception that stopped the job, if any
+        self.reused = 0  # Poles whose parsed notes and municipality came from the job's last run
+        self.report = None  # instrumentation.RunReport of the last run
+        self.report_path = None  # Where it was written, None if it couldn't be
+        self.profile_path = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_running(self) -> bool:
+        return self.thread.is_alive()
+
+    def run(self):
+        """Runs the job in the calling thread; `start` runs this on the worker thread."""
+        profiler = self.options.get('profile') or os.environ.get('POLETOOL_PROFILE') or None
+        self.report = instrumentation.RunReport(input=self.file_path, output=self.output_path, name=self.name,
+                                                actions=self.actions, profile=profiler).activate()
+        try:
+            if profiler:
+                # Work done in other processes wouldn't show up in the profile
+                self.options = dict(self.options, workers=1)
+                with instrumentation.profiled(profiler, os.path.join(self.output_path, self.name)) as profile_path:
+                    self.profile_path = profile_path
+                    self._run(parallel=False)
+            else:
+                self._run(parallel=self.parallel)
+        except Exception as e:  # An unknown or missing profiler
+            self._failed(e)
+        finally:
+            self.report.deactivate()
+            self._write_report()
+
+    def _run(self, parallel: bool):
+        # Loading and parsing count as one step, then one step per action
+        steps = len(self.actions) + 1
+        try:
+            progress = Progress(self, 0, steps)
+            progress('Reading file')
+            file = dataset_cache.load_normalized(self.file_path, progress=progress)
+            owners.report_unmatched(file.attrs.get('unmatched_owners'), self.output_path)
+            # Spans and nearby poles are computed once and shared by the Vetro and MRN sheets
+            if {'Prepare for Vetro', 'Generate Make Ready Notes'} & set(self.actions):
+                file = spatial.with_pole_columns(
+                    file, self.options.get('duplicate_radius_ft', spatial.DUPLICATE_RADIUS_FT))
+            attachments = None
+            if NOTES_ACTIONS & set(self.actions):
+                attachments = self._parse_notes(file, progress)
+            # Posted as the end of the loading step, so the bar doesn't drop back to where parsing started
+            Progress(self, 1, steps)(f'Reused {self.reused} of {len(file)} poles from the last run'
+                                     if attachments is not None else 'File loaded')
+            if parallel and len(self.actions) > 1:
+                self._run_parallel(file, attachments, steps)
+            else:
+                for i, action in enumerate(self.actions, start=1):
+                    progress = Progress(self, i, steps)
+                    progress(action)
+                    start = time.perf_counter()
+                    ok = ACTIONS[action](file, attachments, self.output_path, self.name, self.options, progress)
+                    self._finished(action, ok, time.perf_counter() - start)
+            self.success = all(result['success'] for result in self.results)
+            self.events.put(('progress', 1.0, 'Complete'))
+            self.events.put(('done', self.success))
+        except JobCancelled:
+            self.events.put(('cancelled',))
+        except Exception as e:
+            self._failed(e)
+
+    def _parse_notes(self, file, progress: Progress):
+        """Parses the make ready notes, and resolves municipalities if the Verizon export asks for them."""
+        progress('Parsing make ready notes')
+        # Poles unchanged since this job's last run reuse its parsed lines and municipalities
+        job_manifest = manifest.JobManifest(self.output_path, self.name)
+        with instrumentation.stage('notes', len(file)) as entry:
+            attachments = job_manifest.parse_notes(file, progress=progress)
+            entry.set(rows_out=len(attachments), reused_poles=job_manifest.reused)
+        if self.options.get('use_api') and 'Generate Verizon Application' in self.actions:
+            file['Municipality'] = job_manifest.resolve_municipalities(
+                file, fa.verizon_poles(file, attachments), progress=progress)
+        with instrumentation.stage('save_manifest'):
+            job_manifest.save()
+        self.reused = job_manifest.reused
+        return attachments
+
+    def _failed(self, error: Exception):
+        instrumentation.log_exception(self.output_path, self.name)
+        self.success, self.error = False, str(error)
+        self.events.put(('progress', 1.0, str(error)))
+        self.events.put(('done', False))
+
+    def _write_report(self):
+        path = os.path.join(self.output_path, f'{self.name}-run-report.json')
+        try:
+            self.report.write(path, success=self.success, cancelled=self.cancelled.is_set(), error=self.error,
+                              reused_poles=self.reused, results=self.results, profile_path=self.profile_path)
+            self.report_path = path
+        except OSError:  # e.g. an output folder that doesn't exist; the job's outcome doesn't depend on it
+            self.report_path = None
+
+    def _finished(self, action: str, ok: bool, seconds: float):
+        self.results.append({'action': action, 'success': bool(ok), 'seconds': round(seconds, 3)})
+        self.events.put(('action', action, bool(ok), seconds))
+
+    def _run_parallel(self, file, attachments, steps: int):
+        snapshot = pickle.dumps((file, attachments), protocol=pickle.HIGHEST_PROTOCOL)
+        context = multiprocessing.get_context('spawn')
+        fractions = dict.fromkeys(self.actions, 0.0)
+        cores = os.cpu_count() or 1
+        processes = min(len(self.actions), cores)
+        # The cores are split between the actions, so the Verizon and Frontier pools inside them don't each start
+        # one process per core on top of this pool
+        options = dict(self.options)
+        if options.get('workers') is None:
+            options['workers'] = max(1, cores // processes)
+        with context.Manager() as manager:
+            worker_events, worker_cancelled = manager.Queue(), manager.Event()
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                     initializer=_init_worker, initargs=(snapshot,)) as pool:
+                futures = {pool.submit(_run_action, action, self.output_path, self.name, options,
+                                       worker_events, worker_cancelled): action for action in self.actions}
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    if self.cancelled.is_set():
+                        worker_cancelled.set()
+                    # Relay worker progress as one overall fraction
+                    while not worker_events.empty():
+                        action, message, done_count, total = worker_events.get()
+                        fractions[action] = done_count / total if total else fractions[action]
+                        text = f'{action}: {message} ({done_count}/{total})' if total else f'{action}: {message}'
+                        self.events.put(('progress', (1 + sum(fractions.values())) / steps, text))
+                    for future in done:
+                        ok, seconds, stages = future.result()
+                        self.report.merge(stages)
+                        if ok is not None:
+                            fractions[futures[future]] = 1.0
+                            self._finished(futures[future], ok, seconds)
+        if self.cancelled.is_set():
+            raise JobCancelled
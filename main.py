@@ -1,8 +1,23 @@
 import customtkinter
+import multiprocessing
 import os
+import threading
 from tkinter import filedialog
 from tkinterdnd2 import DND_FILES, TkinterDnD
-import file_actions as fa
+# The export modules (jobs -> file_actions -> pandas/numpy) are imported after the window is up, see warm_up
+# Set once warm_up is done, so the window never imports them on its own thread
+warmed_up = threading.Event()
+
+
+def warm_up():
+    """
+    Imports the export stack on a background thread once the window is drawn. A Process File click that comes
+    first waits for this to finish by polling, so the window stays responsive meanwhile.
+    """
+    try:
+        import jobs  # noqa: F401
+    finally:
+        warmed_up.set()
 
 
 class DraggableLabel(customtkinter.CTkLabel):
@@ -67,6 +82,7 @@ class App(TkinterDnD.Tk):
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
         self.output_path = ""  # Variable to store the selected output path
+        self.job = None  # The running jobs.JobRunner, if any
 
         # --- Appearance ---
         customtkinter.set_appearance_mode("Dark")
@@ -184,6 +200,9 @@ class App(TkinterDnD.Tk):
         self.status_label = customtkinter.CTkLabel(master=drop_zone_frame, text="Status: Idle", text_color="gray")
         self.status_label.grid(row=5, column=0, columnspan=2, padx=0, pady=(5, 10), sticky="ew")
 
+        # Load pandas and the exporters only after the first frame has been drawn
+        self.after_idle(lambda: threading.Thread(target=warm_up, daemon=True).start())
+
     def select_output_path(self):
         """Opens a dialog to select a directory and updates the label."""
         path = filedialog.askdirectory(title="Select Output Folder")
@@ -197,7 +216,7 @@ class App(TkinterDnD.Tk):
     def process_file_callback(self):
         """
         This function is called when the button is clicked.
-        It simulates a process and updates the progress bar.
+        It starts the selected actions on a worker thread and turns the button into a cancel button.
         """
         if not self.drop_label.file_path:
             self.status_label.configure(text="Status: Please drop a file first.")
@@ -216,41 +235,60 @@ class App(TkinterDnD.Tk):
         self.status_label.configure(text="Status: Processing...", text_color="white")
         self.progress_bar.set(0)
 
-        file = fa.read_and_normalize(self.drop_label.file_path)
-
         # --- CHANGE START: Get the state of the API switch ---
         # Get the value (1 for on, 0 for off) from the switch if it exists
         use_api = self.use_api_switch.get() == 1 if self.use_api_switch else False
         # --- CHANGE END ---
 
-        file_action_functions = {
-            "Prepare for Vetro": lambda: fa.vetro_export(file, self.output_path, output_filename),
-            "Generate Make Ready Notes": lambda: fa.generate_mrn(file, self.output_path, output_filename),
-            # --- CHANGE START: Pass the API switch state to the function ---
-            "Generate Verizon Application": lambda: fa.verizon_app(file, self.output_path, output_filename,
-                                                                   use_api=use_api),
-            # --- CHANGE END ---
-            "Generate Frontier Applications (Prototype)": lambda: fa.frontier_pdf(file, self.output_path,
-                                                                                  output_filename),
-        }
-
-        total_steps = len(selected_actions) if selected_actions else 1
-        success = True
-        for i, action in enumerate(selected_actions or ["Processing..."]):
-            self.status_label.configure(text=f"Status: {action}")
-            self.update_idletasks()  # Force UI update
-            if action in file_action_functions:
-                if file_action_functions[action]():
-                    success = True
+        self.process_button.configure(state="disabled")
+        self.start_job(self.drop_label.file_path, self.output_path, output_filename, selected_actions,
+                       {'use_api': use_api})
+
+    def start_job(self, file_path, output_path, output_filename, selected_actions, options):
+        """Starts the job once warm_up has loaded the exporters, checking again every 100 ms until it has."""
+        if not warmed_up.is_set():
+            self.status_label.configure(text="Status: Loading exporters...")
+            self.after(100, self.start_job, file_path, output_path, output_filename, selected_actions, options)
+            return
+        # Already imported by warm_up, so this doesn't block the window
+        import jobs
+        # The job reads, parses and exports on a worker thread; progress comes back through its event queue
+        self.job = jobs.JobRunner(file_path, output_path, output_filename, selected_actions, options=options)
+        self.job.start()
+        self.process_button.configure(text="Cancel", command=self.cancel_job, state="normal")
+        self.after(100, self.poll_job)
+
+    def poll_job(self):
+        """Applies the events posted by the running job, then polls again until it finishes."""
+        finished = False
+        while not self.job.events.empty():
+            event = self.job.events.get_nowait()
+            if event[0] == 'progress':
+                _, fraction, text = event
+                self.progress_bar.set(fraction)
+                self.status_label.configure(text=f"Status: {text}")
+            elif event[0] == 'action':
+                _, action, ok, seconds = event
+                self.status_label.configure(text=f"Status: {action} {'done' if ok else 'failed'} in {seconds:.1f}s")
+            elif event[0] == 'done':
+                finished = True
+                if event[1]:
+                    self.status_label.configure(text="Status: Complete!", text_color="lightgreen")
                 else:
-                    success = False
-            self.progress_bar.set((i + 1) / total_steps)
-            self.update_idletasks()  # Force UI update
-
-        if success:
-            self.status_label.configure(text="Status: Complete!", text_color="lightgreen")
+                    self.status_label.configure(text="Status: Error!", text_color="red")
+            elif event[0] == 'cancelled':
+                finished = True
+                self.status_label.configure(text="Status: Cancelled", text_color="gray")
+        if finished:
+            self.process_button.configure(text="Process File", command=self.process_file_callback, state="normal")
         else:
-            self.status_label.configure(text="Status: Error!", text_color="red")
+            self.after(100, self.poll_job)
+
+    def cancel_job(self):
+        """Asks the running job to stop at its next progress update."""
+        self.job.cancel()
+        self.process_button.configure(state="disabled")
+        self.status_label.configure(text="Status: Cancelling...")
 
     def enable_button(self):
         """Enables the process button."""
@@ -263,5 +301,6 @@ class App(TkinterDnD.Tk):
 
 # --- Main Execution ---
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Export actions run in worker processes, also inside the PyInstaller build
     app = App()
     app.mainloop()
\ No newline at end of file
@@ -5,7 +5,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('rules/owners.json', 'rules'), ('pdf/template.pdf', 'pdf')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,262 @@
+import re
+import numpy
+import pandas
+import heights
+import instrumentation
+
+# Attacher names as they appear at the start of a make ready note line, mapped to the names Verizon expects
+COMPANIES = {
+    'Verizon Pennsylvania Inc.': 'VERIZON WIRELESS(AERIAL)',
+    'CTSI, LLC, Dba Frontier Communications': 'FRONTIER COMMUNICATIONS',
+    'Loop Telecom Pennsylvania LLC': 'LOOP INTERNET HOLDCO LLC',
+    'Comcast': 'COMCAST',
+    'Service Electric Company': 'SERVICE ELECTRIC CABLE TV'
+}
+LOOP = 'LOOP INTERNET HOLDCO LLC'
+
+# One alternation for every company, tried in the order above, matched case-insensitively at the start of a line
+COMPANY_PATTERN = re.compile(
+    '^(?P<company>(?i:' + '|'.join(re.escape(company) for company in COMPANIES) + '))(?P<rest>.*)$')
+# Periods are only stripped at the end of a word, so a decimal amount like 6.5 stays one and is reported
+PUNCTUATION_PATTERN = re.compile(r'[:"\';]|\.(?=\s|$)')
+# e.g. "Proposed Strand at 22-9 Attach" or "Com at 23-4 Raise 6", after punctuation is stripped. Heights and
+# deltas are captured loosely so malformed values can be reported instead of silently dropping the line.
+ATTACHMENT_PATTERN = re.compile(
+    r'(?:^| )(?P<attachment_type>Com|Guy|Strand) at (?P<height>\S+) (?P<action>Raise|Lower|Attach)'
+    r'(?: (?P<delta>\S+))?(?= |$)')
+# A line that names an attachment type and an action but doesn't fit ATTACHMENT_PATTERN (other casing, doubled
+# spaces, 23' 4" heights) is kept with an Error instead of being dropped
+NEAR_MISS_PATTERN = re.compile(r'(?i)\b(?:Com|Guy|Strand)\b.*\b(?:Raise|Lower|Attach)\b')
+
+# Attachments listed under Loop's on each pole, as the Frontier application asks for
+BELOW_LOOP = 4
+# Loop's line the Below Loop sheet measures from; guys (anchors) are neither that line nor listed under it
+LOOP_LINE_TYPES = ('Strand', 'Com')
+
+COLUMNS = ['SCID', 'Line', 'Company', 'Attachment Type', 'Existing Height', 'Action', 'Delta', 'New Height', 'Error']
+# Poles parsed between progress events, when parse_notes is given a progress callback
+PROGRESS_POLES = 5000
+
+
+@instrumentation.timed('parse_notes')
+def parse_notes(file: pandas.DataFrame, progress=None) -> pandas.DataFrame:
+    """
+    Parses the whole Make Ready Notes column into one row per attachment line.
+
+    Args:
+        file: The normalized pole table (needs SCID and Make Ready Notes).
+        progress: Optional callback, called as progress('Make ready notes parsed', done, total) after every
+            PROGRESS_POLES poles. The notes are then parsed in chunks of that many poles, which gives the same table.
+
+    Returns:
+        A table indexed like `file` (one pole can have several rows) with the columns in COLUMNS. Line is the
+        position of the line inside the pole's note, heights and Delta are in inches and Delta is signed, so
+        New Height is always Existing Height + Delta. Lines with a malformed height or amount are kept with a
+        message in Error and NA heights, so one bad note doesn't abort the whole export. Without a Make Ready
+        Notes column the table is empty.
+    """
+    if 'Make Ready Notes' not in file.columns:
+        file = pandas.DataFrame({'SCID': [], 'Make Ready Notes': []}, dtype=object)
+    if progress is None:
+        return _parse_chunk(file)
+    # Every pole's lines are parsed on their own, so chunks of poles concatenate to the whole table
+    tables = []
+    for start in range(0, len(file), PROGRESS_POLES):
+        tables.append(_parse_chunk(file.iloc[start:start + PROGRESS_POLES]))
+        progress('Make ready notes parsed', min(start + PROGRESS_POLES, len(file)), len(file))
+    if not tables:
+        return _parse_chunk(file)
+    return pandas.concat([table for table in tables if len(table)] or tables[:1])
+
+
+def _parse_chunk(file: pandas.DataFrame) -> pandas.DataFrame:
+    """parse_notes for one chunk of poles."""
+    notes = file['Make Ready Notes']
+    # object, so an empty or all-blank column still has the .str accessor
+    notes = notes[notes.map(lambda v: isinstance(v, str))].astype(object)
+    lines = notes.str.split(r'\n+', regex=True).explode()
+    lines = lines.to_frame('text')
+    lines['Line'] = lines.groupby(level=0).cumcount()
+
+    # The index repeats once per line of a pole, so rows are always filtered with positional masks
+    company = lines['text'].str.extract(COMPANY_PATTERN)
+    matched = company['company'].notna().to_numpy()
+    lines, company = lines[matched], company[matched]
+    text = company['rest'].str.replace(PUNCTUATION_PATTERN, '', regex=True)
+    details = text.str.extract(ATTACHMENT_PATTERN)
+    parsed = details['attachment_type'].notna().to_numpy()
+    near_miss = ~parsed & text.str.contains(NEAR_MISS_PATTERN).to_numpy(dtype=bool)
+    matched = parsed | near_miss
+    lines, company, details = lines[matched], company[matched], details[matched]
+    unreadable = pandas.Series(pandas.NA, index=lines.index, dtype='string').mask(
+        near_miss[matched], company['rest'].str.strip(' :').astype('string')
+        + ": expected e.g. 'Com at 23-4 Raise 6' or 'Strand at 22-9 Attach'")
+
+    existing_height, height_errors = heights.to_inches(details['height'])
+    # Raise/Lower lines need a whole number of inches, attach lines keep their height
+    delta, amount_errors = heights.to_amount(details['delta'])
+    moves = details['action'] != 'Attach'
+    delta_errors = amount_errors.where(moves).mask(
+        moves & details['delta'].isna(), details['action'] + ' needs an amount in inches, got nothing')
+    delta = delta.where(moves, 0)
+    delta = delta.where(details['action'] != 'Lower', -delta)
+    new_height, new_height_errors = heights.apply_delta(existing_height, delta)
+
+    table = pandas.DataFrame({
+        'SCID': file.loc[lines.index, 'SCID'],
+        'Line': lines['Line'],
+        'Company': company['company'].str.lower().map({key.lower(): value for key, value in COMPANIES.items()}),
+        'Attachment Type': details['attachment_type'],
+        'Existing Height': existing_height,
+        'Action': details['action'],
+        'Delta': delta,
+        'New Height': new_height,
+        'Error': unreadable.fillna(height_errors).fillna(delta_errors).fillna(new_height_errors)
+    })
+    return table[COLUMNS]
+
+
+def report_errors(attachments: pandas.DataFrame, path):
+    """Appends one error.log line per make ready note line that could not be parsed."""
+    bad = attachments[attachments['Error'].notna()]
+    instrumentation.record(bad_lines=len(bad))
+    if bad.empty:
+        return
+    with open(f'{path}/error.log', 'a+') as f:
+        for scid, line, error in zip(bad['SCID'], bad['Line'], bad['Error']):
+            f.write(f'SCID {scid}, make ready line {line + 1}: {error}\n')
+
+
+class AttachmentIndex:
+    """
+    The valid attachment lines of a job as one per-pole index: lines sorted by pole, then height, in flat arrays,
+    with `offsets[p]:offsets[p + 1]` the lines of pole p (its position in `poles`). Questions like "the attachments
+    below company X on every pole" or "gaps under 12 inches" become binary searches and array shifts over the whole
+    job instead of a pass over each pole's lines.
+
+    Heights are `New Height` (after make ready) by default, pass height='Existing Height' for the pole as surveyed.
+    `lines`, a positional mask over `attachments`, leaves the other lines out of the index.
+    """
+
+    def __init__(self, attachments: pandas.DataFrame, poles: pandas.Index, height: str = 'New Height', lines=None):
+        valid = (attachments['Error'].isna() & attachments[height].notna()).to_numpy()
+        if lines is not None:
+            valid = valid & numpy.asarray(lines, dtype=bool)
+        pole = poles.get_indexer(attachments.index)
+        # Positions in `attachments`, so callers can join back to any of its columns
+        rows = numpy.flatnonzero(valid & (pole >= 0))
+        pole, values = pole[rows], attachments[height].to_numpy(dtype='float64', na_value=numpy.nan)[rows]
+        order = numpy.lexsort((values, pole))
+        self.poles = poles
+        self.attachments = attachments
+        self.height = height
+        self.rows = rows[order]
+        self.pole = pole[order]
+        self.heights = values[order].astype(numpy.int64)
+        self.companies = attachments['Company'].to_numpy(dtype=object)[self.rows]
+        self.types = attachments['Attachment Type'].to_numpy(dtype=object)[self.rows]
+        self.offsets = numpy.searchsorted(self.pole, numpy.arange(len(poles) + 1))
+        # One sortable key per line, so a (pole, height) lookup is a single searchsorted over the job
+        self._keys = (self.pole.astype(numpy.int64) << 32) | self.heights
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lines(self, pole: int) -> slice:
+        """Positions of the lines of the pole at position `pole`, lowest first."""
+        return slice(self.offsets[pole], self.offsets[pole + 1])
+
+    def find(self, company: str, attachment_type=None) -> numpy.ndarray:
+        """
+        Positions of the highest line of `company` on each pole that has one. `attachment_type` (one type or a
+        tuple of them) only considers those lines.
+        """
+        match = self.companies == company
+        if attachment_type is not None:
+            types = (attachment_type,) if isinstance(attachment_type, str) else tuple(attachment_type)
+            match &= numpy.isin(self.types, types)
+        found = numpy.flatnonzero(match)
+        # Sorted by pole, then height, so the last match of each pole is its highest
+        last = numpy.ones(len(found), dtype=bool)
+        last[:-1] = self.pole[found[:-1]] != self.pole[found[1:]]
+        return found[last]
+
+    def neighbours(self, pole: numpy.ndarray, origin: numpy.ndarray, n: int = 4, below: bool = True) \
+            -> pandas.DataFrame:
+        """
+        The `n` lines strictly below (or above) height `origin[i]` on the pole at position `pole[i]`, one row each,
+        closest first (Rank 1), in pole order. `pole` holds each pole at most once; the origins don't
+        have to be lines of this index, e.g. another company's lines looked up in an index without them.
+        """
+        pole, origin = numpy.asarray(pole, dtype=numpy.int64), numpy.asarray(origin, dtype=numpy.int64)
+        # Bound of the lines strictly below / strictly above each origin, on its own pole since keys start with it
+        keys = (pole << 32) | origin
+        bounds = numpy.searchsorted(self._keys, keys, side='left' if below else 'right')
+        columns = {'pole': [], 'rank': [], 'position': [], 'origin': []}
+        for rank in range(1, n + 1):
+            candidate = bounds - rank if below else bounds + rank - 1
+            inside = ((candidate >= self.offsets[pole]) if below else (candidate < self.offsets[pole + 1]))
+            columns['pole'].append(pole[inside])
+            columns['rank'].append(numpy.full(inside.sum(), rank))
+            columns['position'].append(candidate[inside])
+            columns['origin'].append(origin[inside])
+        pole, rank, found, origin = (numpy.concatenate(columns[key])
+                                     for key in ('pole', 'rank', 'position', 'origin'))
+        order = numpy.lexsort((rank, pole))
+        pole, rank, found, origin = pole[order], rank[order], found[order], origin[order]
+        return pandas.DataFrame({
+            'SCID': self.attachments['SCID'].to_numpy()[self.rows[found]],
+            'Rank': rank,
+            'Company': self.companies[found],
+            'Attachment Type': self.types[found],
+            'Height': self.heights[found],
+            'Distance': numpy.abs(origin - self.heights[found]),
+        }, index=self.poles[pole])
+
+    def below(self, company: str, n: int = 4, attachment_type: str = None) -> pandas.DataFrame:
+        """
+        The `n` lines strictly below the highest line of `company` on every pole it is on, one row each, closest
+        first (Rank 1). Indexed by pole like `poles`; Height and Distance (from the company's line) in inches.
+        """
+        found = self.find(company, attachment_type)
+        return self.neighbours(self.pole[found], self.heights[found], n, below=True)
+
+    def above(self, company: str, n: int = 4, attachment_type: str = None) -> pandas.DataFrame:
+        """Like `below`, for the `n` lines strictly above the company's highest line."""
+        found = self.find(company, attachment_type)
+        return self.neighbours(self.pole[found], self.heights[found], n, below=False)
+
+    def clearances(self) -> numpy.ndarray:
+        """Inches from each line down to the next line on its pole, -1 for the lowest line of a pole."""
+        gaps = numpy.full(len(self.rows), -1, dtype=numpy.int64)
+        same_pole = self.pole[1:] == self.pole[:-1]
+        gaps[1:][same_pole] = (self.heights[1:] - self.heights[:-1])[same_pole]
+        return gaps
+
+    def too_close(self, minimum: int) -> pandas.DataFrame:
+        """Lines less than `minimum` inches above the next line on their pole, as rows of `attachments`."""
+        gaps = self.clearances()
+        close = (gaps >= 0) & (gaps < minimum)
+        return self.attachments.iloc[self.rows[close]].assign(Clearance=gaps[close])
+
+
+def below_loop(index: AttachmentIndex, n: int = BELOW_LOOP) -> pandas.DataFrame:
+    """
+    One row per pole with a Loop strand or com line: its proposed height (Loop's highest such line), then the
+    attacher and height of the next `n` other companies' attachments underneath it, closest first. Loop's own lines
+    and guys aren't listed. Heights are in inches, blank where a pole has fewer attachments.
+    """
+    loop = index.find(LOOP, LOOP_LINE_TYPES)
+    poles = index.poles[index.pole[loop]]
+    table = pandas.DataFrame({'SCID': index.attachments['SCID'].to_numpy()[index.rows[loop]],
+                              'Proposed Height': pandas.array(index.heights[loop], dtype='Int64')}, index=poles)
+    attachments = index.attachments
+    others = AttachmentIndex(attachments, index.poles, index.height,
+                             lines=((attachments['Company'] != LOOP) & (attachments['Attachment Type'] != 'Guy'))
+                             .fillna(False).to_numpy(dtype=bool))
+    below = others.neighbours(index.pole[loop], index.heights[loop], n)
+    for rank in range(1, n + 1):
+        lines = below[below['Rank'].to_numpy() == rank]
+        table[f'Attacher {rank}'] = lines['Company'].reindex(poles)
+        table[f'Height {rank}'] = lines['Height'].reindex(poles).astype('Int64')
+    return table
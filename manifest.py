@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import json
+import os
+import uuid
+import numpy
+import pandas
+import make_ready
+import paths
+
+# Bump when what is stored per pole changes, so older manifests are never reused
+MANIFEST_VERSION = 3
+# The input fields the parsed notes and the municipality of a pole are derived from
+HASH_COLUMNS = ['SCID', 'Tag', 'ppl company_tag', 'verizon pennsylvania inc._tag', 'Owner', 'Make Ready Notes',
+                'Latitude', 'Longitude', 'Address Municipality']
+
+
+def derivation_version() -> str:
+    """Fingerprint of the parsing rules and boundary file the stored rows were derived with."""
+    import geocoding
+    boundaries = os.stat(geocoding.BOUNDARIES_PATH).st_mtime_ns if os.path.isfile(geocoding.BOUNDARIES_PATH) else None
+    rules = json.dumps({'version': MANIFEST_VERSION, 'companies': make_ready.COMPANIES,
+                        'company': make_ready.COMPANY_PATTERN.pattern,
+                        'attachment': make_ready.ATTACHMENT_PATTERN.pattern,
+                        'punctuation': make_ready.PUNCTUATION_PATTERN.pattern,
+                        'near_miss': make_ready.NEAR_MISS_PATTERN.pattern, 'boundaries': boundaries},
+                       sort_keys=True)
+    return hashlib.sha256(rules.encode()).hexdigest()[:16]
+
+
+def pole_hashes(file: pandas.DataFrame) -> pandas.Series:
+    """One 64-bit hash per pole over HASH_COLUMNS, indexed like `file`."""
+    columns = [column for column in HASH_COLUMNS if column in file.columns]
+    return pandas.util.hash_pandas_object(file[columns].astype('string'), index=False)
+
+
+def manifest_dir() -> str:
+    path = os.path.join(paths.user_cache_dir(), 'manifests')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class JobManifest:
+    """
+    What the last run of a job (output folder + name) derived per pole: the parsed make ready lines and the
+    resolved municipality, next to a hash of the input fields they came from. A re-export of the same job only
+    parses and geocodes the poles whose hash changed, or that are new, and merges the stored rows back in for the
+    rest. Poles are matched by SCID, so SCIDs that appear more than once are always recomputed.
+
+    Without pyarrow nothing is stored and every pole is recomputed.
+    """
+
+    def __init__(self, output_path, name, directory: str = None):
+        key = hashlib.sha256(f'{os.path.abspath(output_path)}\0{name}'.encode()).hexdigest()[:32]
+        directory = directory or manifest_dir()
+        self.poles_path = os.path.join(directory, f'{key}-poles.feather')
+        self.attachments_path = os.path.join(directory, f'{key}-attachments.feather')
+        self.version = derivation_version()
+        self.reused = 0
+        self.total = 0
+        self._poles = None  # SCID, Hash, Municipality, Resolved of the current run
+        self._attachments = None
+        self._previous_poles, self._previous_attachments = self._load()
+
+    def _load(self):
+        try:
+            import pyarrow.feather as feather
+            poles = feather.read_table(self.poles_path, memory_map=True).to_pandas()
+            attachments = feather.read_table(self.attachments_path, memory_map=True).to_pandas()
+        except Exception:  # No manifest yet, no pyarrow, or an unreadable one
+            return None, None
+        # Both files are written by the same run, and by the same parsing rules
+        if (poles.attrs.get('run') != attachments.attrs.get('run') or poles.attrs.get('version') != self.version):
+            return None, None
+        return poles, attachments
+
+    def parse_notes(self, file: pandas.DataFrame, progress=None) -> pandas.DataFrame:
+        """
+        `make_ready.parse_notes(file, progress)`, parsing only the poles that changed since the last run (so the
+        progress total is the number of changed poles).
+        """
+        hashes = pole_hashes(file).to_numpy()
+        scid = file['SCID'].astype('string')
+        self._poles = pandas.DataFrame({'SCID': scid.to_numpy(), 'Hash': hashes,
+                                        'Municipality': pandas.array([pandas.NA] * len(file), dtype='string'),
+                                        'Resolved': numpy.zeros(len(file), dtype=bool)})
+        reusable = numpy.zeros(len(file), dtype=bool)
+        if self._previous_poles is not None:
+            previous = self._previous_poles.drop_duplicates('SCID', keep=False).reset_index(drop=True)
+            # Position of each pole in the previous run, -1 for new ones
+            match = pandas.Index(previous['SCID'].astype('string')).get_indexer(scid)
+            reusable = (match >= 0) & scid.notna().to_numpy() & ~scid.duplicated(keep=False).to_numpy()
+            reusable[reusable] = previous['Hash'].to_numpy()[match[reusable]] == hashes[reusable]
+        self.reused, self.total = int(reusable.sum()), len(file)
+
+        fresh = make_ready.parse_notes(file[~reusable], progress=progress)
+        if not reusable.any():
+            self._attachments = fresh
+            return fresh
+
+        # Stored rows are keyed by SCID; give them the index of their pole in this file
+        stored = self._previous_attachments
+        stored_scid = pandas.Index(scid[reusable].to_numpy()).get_indexer(stored['SCID'].astype('string'))
+        stored = stored[stored_scid >= 0]
+        stored.index = file.index[numpy.flatnonzero(reusable)[stored_scid[stored_scid >= 0]]]
+        attachments = pandas.concat([stored[make_ready.COLUMNS], fresh]) if len(fresh) else stored[make_ready.COLUMNS]
+        # Same order as parse_notes gives: by pole, then by line
+        attachments = attachments.iloc[numpy.lexsort((attachments['Line'].to_numpy(),
+                                                      file.index.get_indexer(attachments.index)))]
+        # Municipalities resolved last time stay valid, the coordinates are part of the hash
+        carried = previous.iloc[match[reusable]]
+        self._poles.loc[reusable, 'Municipality'] = carried['Municipality'].to_numpy()
+        self._poles.loc[reusable, 'Resolved'] = carried['Resolved'].to_numpy(dtype=bool)
+        self._attachments = attachments
+        return attachments
+
+    def resolve_municipalities(self, file: pandas.DataFrame, poles, progress=None) -> pandas.Series:
+        """
+        Municipalities for the poles selected by the positional mask `poles`, indexed like `file`. Poles whose
+        address names a municipality get that one; only the others that changed or were never resolved are looked
+        up. Call after `parse_notes`.
+        """
+        import geocoding
+        poles = numpy.asarray(poles, dtype=bool)
+        pending = poles & ~self._poles['Resolved'].to_numpy(dtype=bool)
+        if 'Address Municipality' in file.columns:
+            from_address = file['Address Municipality'].astype('string').to_numpy()
+            named = pending & file['Address Municipality'].notna().to_numpy()
+            self._poles.loc[named, 'Municipality'] = from_address[named]
+            self._poles.loc[named, 'Resolved'] = True
+            pending &= ~named
+        if pending.any():
+            resolved = geocoding.resolve_municipalities(file['Latitude'][pending], file['Longitude'][pending],
+                                                        resolver=geocoding.load_resolver(), progress=progress)
+            self._poles.loc[pending, 'Municipality'] = resolved.astype('string').to_numpy()
+            # Poles nothing could place are asked about again next run
+            self._poles.loc[pending, 'Resolved'] = resolved.notna().to_numpy()
+        return pandas.Series(self._poles['Municipality'].to_numpy(dtype=object), index=file.index).where(
+            self._poles['Resolved'].to_numpy(dtype=bool), None)
+
+    def save(self):
+        """Stores this run's rows for the next run. Written through temp files, both tagged with one run id."""
+        try:
+            import pyarrow.feather as feather
+        except ImportError:
+            return
+        if self._poles is None:
+            return
+        run = uuid.uuid4().hex
+        poles = self._poles.copy()
+        attachments = self._attachments.assign(SCID=self._attachments['SCID'].astype('string')).reset_index(drop=True)
+        for frame in (poles, attachments):
+            frame.attrs = {'run': run, 'version': self.version}
+        for frame, path in ((attachments, self.attachments_path), (poles, self.poles_path)):
+            try:
+                paths.write_atomic(path, functools.partial(feather.write_feather, frame))
+            except Exception:  # Not stored, the next run just recomputes everything
+                return
@@ -0,0 +1,131 @@
+import json
+import os
+import re
+import sys
+import numpy
+import pandas
+import paths
+
+# Owner normalization rules, editable without rebuilding the app. Rules are tried in order: exact spellings, then
+# prefixes, then regular expressions (re.search, so anchor them as needed); anything left gets the default owner.
+RULES_PATH = paths.resource_path(os.path.join('rules', 'owners.json'))
+UNKNOWN_OWNER = 'Surveyed / Unknown Owner'
+# Used when the rules file is missing, so a broken install still exports with the owners it shipped with
+BUILTIN_RULES = {
+    'exact': {
+        'PPL Company': 'PPL',
+        'Verizon Pennsylvania Inc.': 'Verizon',
+        'Frontier Communications of PA. - New Holland': 'Frontier',
+        'Frontier Communications of PA. - New Holland Telecom': 'Frontier',
+        'Frontier Communications - Lakewood': 'Frontier',
+        'Frontier Communications - Lakewood Telecom': 'Frontier',
+        'Commonwealth Telephone Co.  dba Frontier Comm.': 'Frontier',
+        'Commonwealth Telephone Co.  dba Frontier Comm. Telecom': 'Frontier',
+        'Loop Telecom Pennsylvania LLC': 'Loop Internet',
+        'UGI Utilities - Electric Division': 'UGI',
+        'UGI Utilities - Gas': 'UGI',
+        'UGI PENN NATURAL GAS, INC': 'UGI',
+        'Service Electric Cablevision Inc - Mahanoy City': 'Service Electric',
+        'Service Electric Cablevision': 'Service Electric',
+        'Service Electric Cable TV Inc.': 'Service Electric',
+        'Service Electric Company - Wilkes-Barre': 'Service Electric',
+        'Upper Oxford Twp, Chester Co.': 'Xfinity',
+        'City of Scranton - Wireless': 'City of Scranton',
+        'City of Scranton': 'City of Scranton',
+        'City of Scranton Office of Economic & Community Development': 'City of Scranton',
+        'CTSI, LLC, dba Frontier Communications': 'CTSI'
+    },
+    'prefix': {},
+    'regex': {},
+    'default': UNKNOWN_OWNER
+}
+
+
+class OwnerRules:
+    """Katapult pole_owner spellings mapped to the owner names used in every export."""
+
+    def __init__(self, exact: dict, prefix: dict = None, regex: dict = None, default: str = UNKNOWN_OWNER):
+        self.exact = dict(exact)
+        self.prefix = list((prefix or {}).items())
+        self.regex = [(re.compile(pattern), owner) for pattern, owner in (regex or {}).items()]
+        self.default = default
+        # Every name a rule can produce, so the owner column has the same categories whatever the input
+        names = set(self.exact.values()) | {owner for _, owner in self.prefix} | {owner for _, owner in self.regex}
+        self.categories = pandas.CategoricalDtype(sorted(names) + [default])
+        self._matches = {}
+
+    @classmethod
+    def from_file(cls, path: str = RULES_PATH) -> 'OwnerRules':
+        with open(path, encoding='utf-8') as f:
+            rules = json.load(f)
+        return cls(rules.get('exact', {}), rules.get('prefix'), rules.get('regex'),
+                   rules.get('default', UNKNOWN_OWNER))
+
+    def rules(self) -> dict:
+        """The rules as plain data, e.g. to fingerprint them."""
+        return {'exact': self.exact, 'prefix': self.prefix, 'regex': [(p.pattern, o) for p, o in self.regex],
+                'default': self.default}
+
+    def match(self, spelling: str):
+        """The owner name for one raw spelling, or None if no rule matches it."""
+        if spelling not in self._matches:
+            owner = self.exact.get(spelling)
+            if owner is None:
+                owner = next((owner for prefix, owner in self.prefix if spelling.startswith(prefix)), None)
+            if owner is None:
+                owner = next((owner for pattern, owner in self.regex if pattern.search(spelling)), None)
+            self._matches[spelling] = owner
+        return self._matches[spelling]
+
+    def normalize(self, owners: pandas.Series) -> tuple[pandas.Series, pandas.Series]:
+        """
+        Maps a raw pole_owner column. Rules run once per distinct spelling, not once per pole.
+
+        Returns:
+            (owners, unmatched): the owner names as a categorical Series indexed like `owners`, and the pole count
+            of every non-blank spelling no rule matched (which were given the default owner), most common first.
+        """
+        codes, spellings = pandas.factorize(owners)
+        names = [self.match(str(spelling)) for spelling in spellings]
+        default_code = self.categories.categories.get_loc(self.default)
+        # The extra trailing entry is picked up by factorize's -1 for blank owners
+        lookup = numpy.array([default_code if name is None else self.categories.categories.get_loc(name)
+                              for name in names] + [default_code], dtype=numpy.int64)
+        normalized = pandas.Series(pandas.Categorical.from_codes(lookup[codes], dtype=self.categories),
+                                   index=owners.index, name=owners.name)
+
+        counts = numpy.bincount(codes[codes >= 0], minlength=len(spellings))
+        unmatched = numpy.array([name is None for name in names], dtype=bool)
+        unmatched = pandas.Series(counts[unmatched], index=pandas.Index(spellings[unmatched], dtype=object),
+                                  dtype=numpy.int64)
+        return normalized, unmatched.sort_values(ascending=False, kind='stable')
+
+
+_loaded = {}
+
+
+def load_rules(path: str = RULES_PATH) -> OwnerRules:
+    """The rules in `path`, parsed again only when the file changes. BUILTIN_RULES when there is no such file."""
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        key = None
+    if key not in _loaded:
+        _loaded.clear()
+        if key is None:
+            print(f'Owner rules {path} not found, using the built-in rules', file=sys.stderr)
+            _loaded[key] = OwnerRules(BUILTIN_RULES['exact'], BUILTIN_RULES['prefix'], BUILTIN_RULES['regex'],
+                                      BUILTIN_RULES['default'])
+        else:
+            _loaded[key] = OwnerRules.from_file(path)
+    return _loaded[key]
+
+
+def report_unmatched(unmatched: dict, path):
+    """Appends a summary of the pole_owner spellings that no rule matched to error.log."""
+    if not unmatched:
+        return
+    with open(f'{path}/error.log', 'a+') as f:
+        f.write(f'{len(unmatched)} pole owner spelling(s) matched no rule in {RULES_PATH}:\n')
+        for spelling, count in unmatched.items():
+            f.write(f'    {spelling!r}: {count} pole(s)\n')
@@ -0,0 +1,48 @@
+import os
+import sys
+
+
+def user_cache_dir() -> str:
+    """Per-user directory for PoleTool caches (%LOCALAPPDATA%\\PoleTool on Windows, ~/.cache/poletool elsewhere)."""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+        path = os.path.join(base, 'PoleTool')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+        path = os.path.join(base, 'poletool')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def app_dir() -> str:
+    """Folder the app's bundled files live in: the PyInstaller bundle when frozen, the source folder otherwise."""
+    if getattr(sys, 'frozen', False):
+        return getattr(sys, '_MEIPASS', os.path.dirname(sys.executable))
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def resource_path(relative: str) -> str:
+    """
+    Absolute path of a data file shipped with the app, whatever the working directory. A frozen app prefers a copy
+    next to the executable, so files like rules/owners.json can be edited without rebuilding.
+    """
+    if getattr(sys, 'frozen', False):
+        beside = os.path.join(os.path.dirname(sys.executable), relative)
+        if os.path.exists(beside):
+            return beside
+    return os.path.join(app_dir(), relative)
+
+
+def write_atomic(path: str, write):
+    """
+    Calls `write(temp_path)` and moves the result onto `path` in one step, so a reader never sees a half-written
+    file. The temporary file is removed, and the error re-raised, if `write` fails.
+    """
+    temp = f'{path}.{os.getpid()}.tmp'
+    try:
+        write(temp)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
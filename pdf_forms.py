@@ -0,0 +1,131 @@
+import io
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+import pypdf
+import instrumentation
+import paths
+
+TEMPLATE_PATH = paths.resource_path(os.path.join('pdf', 'template.pdf'))
+
+
+class FormFiller:
+    """
+    Fills copies of a fillable PDF template. The template and its AcroForm field map are parsed once; every fill
+    clones the already-parsed document instead of reading the file again.
+    """
+
+    def __init__(self, template_path: str = TEMPLATE_PATH):
+        self.reader = pypdf.PdfReader(template_path)
+        self.fields = set(self.reader.get_fields() or {})
+
+    def fill(self, values: dict, flatten: bool = False) -> bytes:
+        """
+        Args:
+            values: Field name to value. Names that aren't in the template are ignored, None/NaN become blank.
+            flatten: Burn the values into the page content and drop the form widgets. Flattened copies can be
+                merged into one document without their identically named fields overwriting each other.
+
+        Returns:
+            The serialized filled PDF.
+        """
+        values = {field: '' if value is None or (isinstance(value, float) and math.isnan(value)) else str(value)
+                  for field, value in values.items() if field in self.fields}
+        writer = pypdf.PdfWriter(clone_from=self.reader)
+        writer.update_page_form_field_values(None, values, flatten=flatten)
+        if flatten:
+            writer.remove_annotations(subtypes='/Widget')
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def merge(documents, output_path):
+        """Writes the pages of several serialized PDFs, in order, to one file."""
+        writer = pypdf.PdfWriter()
+        for document in documents:
+            writer.append(pypdf.PdfReader(io.BytesIO(document)))
+        with open(output_path, 'wb') as output_file:
+            writer.write(output_file)
+
+
+def write_pdf(output_path, data: bytes):
+    """Writes a rendered PDF through a temporary file, so a reader never sees a half-written one."""
+    def write(temp):
+        with open(temp, 'wb') as output_file:
+            output_file.write(data)
+    paths.write_atomic(output_path, write)
+
+
+# Each renderer process keeps its own parsed template
+_filler = None
+
+
+def _init_renderer(template_path: str):
+    global _filler
+    _filler = FormFiller(template_path)
+
+
+def _render_group(values: dict, targets: list, flatten_copy: bool):
+    document = _filler.fill(values)
+    for target in targets:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        write_pdf(target, document)
+    return _filler.fill(values, flatten=True) if flatten_copy else None
+
+
+@instrumentation.timed('pdf_fill')
+def render_groups(groups, template_path: str = TEMPLATE_PATH, workers: int = None, merged_path: str = None,
+                  progress=None, total: int = 0) -> int:
+    """
+    Fills and writes groups as they are produced.
+
+    Args:
+        groups: Iterable of (values, target paths, pole count). It is consumed lazily, so a generator keeps only
+            a few groups in memory at a time.
+        workers: Renderer processes. 1 renders in this process; None uses every core.
+        merged_path: Also write every group, flattened and in order, into this single PDF.
+        progress: Optional callback, called as progress(message, done, total) after each group.
+        total: Pole count reported to `progress`.
+
+    Returns:
+        The number of groups written.
+    """
+    workers = workers or os.cpu_count() or 1
+    flattened = {}
+    written = poles = 0
+
+    def finished(index: int, pole_count: int, flattened_copy):
+        nonlocal written, poles
+        if flattened_copy is not None:
+            flattened[index] = flattened_copy
+        written += 1
+        poles += pole_count
+        if progress:
+            progress('Poles written', poles, total)
+
+    if workers == 1:
+        _init_renderer(template_path)
+        for index, (values, targets, pole_count) in enumerate(groups):
+            finished(index, pole_count, _render_group(values, targets, merged_path is not None))
+    else:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_renderer,
+                                 initargs=(template_path,)) as pool:
+            # Only keep a couple of groups per worker in flight so the generator is not drained up front
+            pending = {}
+            for index, (values, targets, pole_count) in enumerate(groups):
+                future = pool.submit(_render_group, values, targets, merged_path is not None)
+                pending[future] = (index, pole_count)
+                if len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished(*pending.pop(future), future.result())
+            for future in as_completed(pending):
+                finished(*pending[future], future.result())
+
+    if merged_path and flattened:
+        FormFiller.merge((flattened[index] for index in sorted(flattened)), merged_path)
+    instrumentation.record(rows_out=written, poles=poles, workers=workers)
+    return written
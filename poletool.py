@@ -0,0 +1,217 @@
+"""
+Headless entry point: runs the same exports as the window over one or many Katapult exports.
+
+    python poletool.py exports/*.xlsx -a vetro mrn -o out/{stem}
+    python poletool.py "2025-*/**/*.xlsx" -a verizon --use-api -n {stem}-{date} --json
+    python poletool.py --watch incoming -a vetro mrn -o "exports/{stem}"
+
+Exit codes: 0 when every file succeeded, 1 when any file failed, 2 for usage errors or no matching input files.
+With --watch the folder is watched until interrupted (see watch_folder.py).
+"""
+import argparse
+import datetime
+import functools
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import instrumentation
+import jobs
+
+# Short command-line names for jobs.ACTIONS
+ACTIONS = {
+    'vetro': 'Prepare for Vetro',
+    'mrn': 'Generate Make Ready Notes',
+    'verizon': 'Generate Verizon Application',
+    'frontier': 'Generate Frontier Applications (Prototype)',
+}
+INPUT_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+# Where watch mode writes exports by default, inside the watched folder
+WATCH_OUTPUT_DIR = 'output'
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    """Files and glob patterns (** included) to a sorted list of input files, without duplicates."""
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            # Skips Excel's ~$ lock files next to open workbooks
+            if (os.path.isfile(match) and match.lower().endswith(INPUT_EXTENSIONS)
+                    and not os.path.basename(match).startswith('~$')):
+                files.add(os.path.abspath(match))
+    return sorted(files)
+
+
+def fill_template(template: str, file_path: str) -> str:
+    """Fills {stem}, {name}, {dir} and {date} from the input file path."""
+    return template.format(stem=os.path.splitext(os.path.basename(file_path))[0], name=os.path.basename(file_path),
+                           dir=os.path.dirname(file_path), date=datetime.date.today().isoformat())
+
+
+def process_file(file_path: str, output_path: str, name: str, actions: list[str], options: dict,
+                 parallel: bool) -> dict:
+    """Runs one input file through the selected actions and returns its status."""
+    start = time.perf_counter()
+    try:
+        os.makedirs(output_path, exist_ok=True)
+        job = jobs.JobRunner(file_path, output_path, name, actions, options=options, parallel=parallel)
+        job.run()
+        success, error, results, reused = job.success, job.error, job.results, job.reused
+        report, profile = job.report_path, job.profile_path
+    except Exception as e:  # e.g. an output folder that can't be created
+        success, error, results, reused, report, profile = False, str(e), [], 0, None, None
+    return {'file': file_path, 'output': output_path, 'name': name, 'success': bool(success), 'error': error,
+            'actions': results, 'reused_poles': reused, 'report': report, 'profile': profile,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def process_template(file_path: str, output_template: str, name_template: str, actions: list[str],
+                     options: dict) -> dict:
+    """`process_file` with the output folder and name filled in for `file_path`; what watch mode runs per file."""
+    return process_file(file_path, fill_template(output_template, file_path), fill_template(name_template, file_path),
+                        actions, options, parallel=False)
+
+
+def print_status(status: dict):
+    detail = ', '.join(f"{result['action']} {'ok' if result['success'] else 'failed'} {result['seconds']:.1f}s"
+                       for result in status['actions'])
+    if status['reused_poles']:
+        detail = f"{detail}; {status['reused_poles']} poles reused"
+    if status['error']:
+        detail = f"{detail}; {status['error']}" if detail else status['error']
+    print(f"{'OK  ' if status['success'] else 'FAIL'} {status['file']} ({status['seconds']:.1f}s) {detail}", flush=True)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='poletool', description=__doc__.split('\n\n')[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog='Templates can use {stem}, {name}, {dir} and {date} of each input file.')
+    parser.add_argument('inputs', nargs='+',
+                        help='Katapult node attribute exports (.xlsx/.csv) or glob patterns; with --watch, the '
+                             'folder to watch')
+    parser.add_argument('-a', '--actions', nargs='+', choices=ACTIONS, default=['vetro', 'mrn'],
+                        help='Exports to run (default: vetro mrn)')
+    parser.add_argument('-o', '--output', help='Output folder template (default: {dir}, or {dir}/output with --watch)')
+    parser.add_argument('-n', '--name', default='{stem}', help='Output file name template (default: {stem})')
+    parser.add_argument('--use-api', action='store_true', help='Split the Verizon application by municipality')
+    parser.add_argument('--side-outputs', nargs='+', choices=['csv', 'parquet'], default=[],
+                        help='Also write the exported sheets in these formats')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Input files processed at once (default: one per core)')
+    parser.add_argument('--profile', choices=instrumentation.PROFILERS,
+                        help='Profile each file with this profiler; the profile is written next to its outputs')
+    parser.add_argument('--json', action='store_true', help='Print the per-file status as JSON')
+    watch = parser.add_argument_group('watch mode')
+    watch.add_argument('--watch', action='store_true',
+                       help='Process every export dropped into the folder until interrupted')
+    watch.add_argument('--settle', type=float, default=10.0,
+                       help='Seconds a file must stay unchanged before it is processed (default: 10)')
+    watch.add_argument('--interval', type=float, default=2.0, help='Seconds between polls (default: 2)')
+    watch.add_argument('--done', help='Folder processed files are moved to (default: done/ in the watched folder)')
+    watch.add_argument('--failed', help='Folder failed files are moved to (default: failed/ in the watched folder)')
+    watch.add_argument('--once', action='store_true', help='Stop once the files already in the folder are processed')
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.watch and (len(args.inputs) != 1 or not os.path.isdir(args.inputs[0])):
+        parser.error('--watch takes one existing folder')
+    if args.output is None:
+        # Exports written into the watched folder would be picked up as new input
+        args.output = os.path.join('{dir}', WATCH_OUTPUT_DIR) if args.watch else '{dir}'
+    return args
+
+
+def watch(args, actions: list[str], options: dict, report) -> int:
+    import watch_folder
+    if args.jobs > 1:
+        options['workers'] = 1
+    process = functools.partial(process_template, output_template=args.output, name_template=args.name,
+                                actions=actions, options=options)
+    failed = []
+
+    def report_status(status: dict):
+        if not status['success']:
+            failed.append(status['file'])
+        report(status)
+
+    watcher = watch_folder.FolderWatcher(args.inputs[0], process, workers=args.jobs, interval=args.interval,
+                                         settle=args.settle, done_dir=args.done, failed_dir=args.failed,
+                                         report=report_status,
+                                         warm_geocoding=options['use_api'] and ACTIONS['verizon'] in actions)
+    if not args.json:
+        print(f'Watching {watcher.folder} ({args.jobs} at a time), Ctrl+C to stop', flush=True)
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        return 130
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    actions = [ACTIONS[action] for action in dict.fromkeys(args.actions)]
+    options = {'use_api': args.use_api, 'side_outputs': tuple(args.side_outputs), 'profile': args.profile}
+    if args.watch:
+        # One line (or JSON object) per file as it finishes, the run has no end to summarize at
+        return watch(args, actions, options,
+                     lambda status: print(json.dumps(status), flush=True) if args.json else print_status(status))
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        print('poletool: no input files matched', file=sys.stderr)
+        return EXIT_USAGE
+
+    workers = min(args.jobs, len(files))
+    if workers > 1:
+        # The cores already go to whole files, so the exports don't start pools of their own
+        options['workers'] = 1
+    tasks = [(file_path, fill_template(args.output, file_path), fill_template(args.name, file_path))
+             for file_path in files]
+
+    statuses = []
+
+    def report(status: dict):
+        statuses.append(status)
+        if not args.json:
+            print_status(status)
+
+    try:
+        if workers == 1:
+            for file_path, output_path, name in tasks:
+                report(process_file(file_path, output_path, name, actions, options, parallel=len(files) == 1))
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {pool.submit(process_file, file_path, output_path, name, actions, options, False):
+                           (file_path, output_path, name) for file_path, output_path, name in tasks}
+                for future in as_completed(futures):
+                    try:
+                        report(future.result())
+                    except Exception as e:  # The worker died (BrokenProcessPool) or the status couldn't come back
+                        file_path, output_path, name = futures[future]
+                        report({'file': file_path, 'output': output_path, 'name': name, 'success': False,
+                                'error': f'{type(e).__name__}: {e}', 'actions': [], 'reused_poles': 0,
+                                'report': None, 'profile': None, 'seconds': 0.0})
+    except KeyboardInterrupt:
+        return 130
+
+    statuses.sort(key=lambda status: status['file'])
+    failed = sum(not status['success'] for status in statuses)
+    if args.json:
+        print(json.dumps(statuses, indent=2))
+    else:
+        print(f'{len(statuses) - failed}/{len(statuses)} files succeeded')
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import numpy
+import pandas
+import instrumentation
+
+EARTH_RADIUS_FT = 20_902_231
+FEET_PER_DEGREE = EARTH_RADIUS_FT * numpy.pi / 180
+# Poles closer than this are flagged as possible duplicates or stacked poles
+DUPLICATE_RADIUS_FT = 10.0
+# Added to the Vetro and MRN sheets. The node export has no connections, so the distance is to the previous pole in
+# row order; it is only a span where the export lists poles along the line.
+COLUMNS = ['Previous Pole (ft)', 'Nearby Pole', 'Nearby Pole (ft)']
+# Cells the grid search looks in around a point's own cell
+_NEIGHBOURS = [(row, column) for row in (-1, 0, 1) for column in (-1, 0, 1)]
+
+
+def haversine_ft(lat1, lon1, lat2, lon2) -> numpy.ndarray:
+    """Great-circle distance in feet between coordinate arrays (degrees), element-wise. NaN where any is missing."""
+    lat1, lon1, lat2, lon2 = (numpy.radians(numpy.asarray(values, dtype=float))
+                              for values in (lat1, lon1, lat2, lon2))
+    a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_FT * numpy.arcsin(numpy.sqrt(numpy.clip(a, 0, 1)))
+
+
+class PoleIndex:
+    """
+    Grid index over pole coordinates for fixed-radius neighbour queries. Points are bucketed into cells at least
+    `radius` feet wide and sorted by cell, so every pair closer than the radius sits in the same or an adjacent cell
+    and is found with a binary search per cell instead of comparing all pairs. Building is O(n log n); a query
+    costs that plus the number of pairs it finds.
+
+    Poles without coordinates are never anybody's neighbour.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        self.latitudes = numpy.asarray(latitudes, dtype=float)
+        self.longitudes = numpy.asarray(longitudes, dtype=float)
+        self.valid = numpy.flatnonzero(~(numpy.isnan(self.latitudes) | numpy.isnan(self.longitudes)))
+
+    def _cells(self, radius_ft: float):
+        """(order, sorted keys, keys by point, row width) of the grid for `radius_ft`, over the valid points."""
+        latitudes, longitudes = self.latitudes[self.valid], self.longitudes[self.valid]
+        # A degree of longitude is shortest at the latitude furthest from the equator, sizing cells there keeps
+        # them at least `radius_ft` wide everywhere
+        shrink = max(numpy.cos(numpy.radians(numpy.abs(latitudes).max())), 1e-6)
+        rows = ((latitudes - latitudes.min()) * FEET_PER_DEGREE // radius_ft).astype(numpy.int64)
+        columns = ((longitudes - longitudes.min()) * FEET_PER_DEGREE * shrink // radius_ft).astype(numpy.int64)
+        # Columns start at 1 and rows have two spare cells, so a neighbour's key never wraps onto another row
+        width = int(columns.max()) + 3
+        keys = rows * width + columns + 1
+        order = numpy.argsort(keys, kind='stable')
+        return order, keys[order], keys, width
+
+    def pairs_within(self, radius_ft: float) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Every pair of poles closer than `radius_ft`, once each: (first positions, second positions, distances in
+        feet), with first < second.
+        """
+        empty = numpy.array([], dtype=numpy.int64)
+        if len(self.valid) < 2:
+            return empty, empty, numpy.array([], dtype=float)
+        order, sorted_keys, keys, width = self._cells(radius_ft)
+        firsts, seconds = [], []
+        for row, column in _NEIGHBOURS:
+            targets = keys + row * width + column
+            starts = numpy.searchsorted(sorted_keys, targets, side='left')
+            counts = numpy.searchsorted(sorted_keys, targets, side='right') - starts
+            # Point i against every point of the target cell, without a Python loop over points
+            first = numpy.repeat(numpy.arange(len(keys)), counts)
+            within = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+            second = order[numpy.repeat(starts, counts) + within]
+            keep = first < second
+            firsts.append(first[keep])
+            seconds.append(second[keep])
+        first, second = self.valid[numpy.concatenate(firsts)], self.valid[numpy.concatenate(seconds)]
+        distances = haversine_ft(self.latitudes[first], self.longitudes[first],
+                                 self.latitudes[second], self.longitudes[second])
+        close = distances < radius_ft
+        return first[close], second[close], distances[close]
+
+    def nearest_within(self, radius_ft: float) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        For every pole, the position of the closest other pole less than `radius_ft` away and its distance in feet;
+        -1 and NaN for poles with no pole that close.
+        """
+        first, second, distances = self.pairs_within(radius_ft)
+        nearest = numpy.full(len(self.latitudes), -1, dtype=numpy.int64)
+        nearest_ft = numpy.full(len(self.latitudes), numpy.nan)
+        # Both directions of every pair, closest first per pole, then the first row of each pole wins
+        points = numpy.concatenate([first, second])
+        others = numpy.concatenate([second, first])
+        distances = numpy.concatenate([distances, distances])
+        ranked = numpy.lexsort((distances, points))
+        points, others, distances = points[ranked], others[ranked], distances[ranked]
+        first_of_point = numpy.ones(len(points), dtype=bool)
+        first_of_point[1:] = points[1:] != points[:-1]
+        nearest[points[first_of_point]] = others[first_of_point]
+        nearest_ft[points[first_of_point]] = distances[first_of_point]
+        return nearest, nearest_ft
+
+    def previous_distances(self, selected=None) -> numpy.ndarray:
+        """
+        Distance in feet from each point picked by the positional mask `selected` (all by default) to the previous
+        picked point with coordinates, in row order. NaN for the first one, points without coordinates and points
+        that aren't picked.
+        """
+        distances = numpy.full(len(self.latitudes), numpy.nan)
+        points = self.valid if selected is None else self.valid[numpy.asarray(selected, dtype=bool)[self.valid]]
+        distances[points[1:]] = haversine_ft(self.latitudes[points[:-1]], self.longitudes[points[:-1]],
+                                             self.latitudes[points[1:]], self.longitudes[points[1:]])
+        return distances
+
+
+def pole_nodes(file: pandas.DataFrame) -> numpy.ndarray:
+    """
+    Positional mask of the rows that are real poles: 'pole' nodes (every row when the export has no node type)
+    that aren't reference poles.
+    """
+    import file_actions as fa
+    poles = ~fa.reference_poles(file['SCID'])
+    if 'Pole Type' in file.columns:
+        poles &= (file['Pole Type'].astype('string').str.strip().str.lower() == 'pole').fillna(False)
+    return poles.to_numpy(dtype=bool)
+
+
+@instrumentation.timed('spatial')
+def pole_columns(file: pandas.DataFrame, radius_ft: float = DUPLICATE_RADIUS_FT) -> pandas.DataFrame:
+    """
+    COLUMNS for the normalized frame: the distance from the previous pole in the export's row order, and the SCID
+    of and distance to the closest pole less than `radius_ft` away (blank when there is none), to spot duplicate or
+    stacked poles. Only pole_nodes take part; reference poles, anchors and other nodes are left blank.
+    """
+    # Other nodes get no coordinates in the index, so they are never measured to or reported as a nearby pole
+    poles = pole_nodes(file)
+    index = PoleIndex(file['Latitude'].where(poles), file['Longitude'].where(poles))
+    nearest, nearest_ft = index.nearest_within(radius_ft)
+    scid = file['SCID'].astype('string').to_numpy()
+    return pandas.DataFrame({
+        'Previous Pole (ft)': index.previous_distances().round(1),
+        'Nearby Pole': pandas.array(numpy.where(nearest >= 0, scid[nearest], pandas.NA), dtype='string'),
+        'Nearby Pole (ft)': nearest_ft.round(1),
+    }, index=file.index)
+
+
+def with_pole_columns(file: pandas.DataFrame, radius_ft: float = DUPLICATE_RADIUS_FT) -> pandas.DataFrame:
+    """`file` with COLUMNS added, or `file` itself when they were already added, e.g. once for the whole job."""
+    if all(column in file.columns for column in COLUMNS):
+        return file
+    return file.assign(**pole_columns(file, radius_ft))
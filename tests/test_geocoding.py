@@ -0,0 +1,188 @@
+"""
+Runs the Nominatim fallback against a stub server on localhost instead of the public service:
+
+    python -m unittest discover tests
+
+The stub answers /reverse like Nominatim does, can be told to fail a coordinate's first requests with a 503, and
+records when every request arrived, so retries, backoff and the rate limit can be checked from the outside.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas  # noqa: E402
+import geocache  # noqa: E402
+import geocoding  # noqa: E402
+
+
+class StubNominatim(ThreadingHTTPServer):
+    """
+    Reverse geocoding server on a free local port. `failures` maps a (lat, lon) pair to the number of 503s it gets
+    before a real answer; every request is kept in `requests` as (arrival time, (lat, lon), status).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, municipality: str = 'Hazleton', failures: dict = None):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.municipality = municipality
+        self.failures = dict(failures or {})
+        self.requests = []
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+
+    @property
+    def domain(self) -> str:
+        return f'127.0.0.1:{self.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def times(self, coordinate=None) -> list[float]:
+        return [when for when, requested, _ in self.requests if coordinate is None or requested == coordinate]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        coordinate = (float(query['lat'][0]), float(query['lon'][0]))
+        server = self.server
+        with server.lock:
+            failing = server.failures.get(coordinate, 0) > 0
+            if failing:
+                server.failures[coordinate] -= 1
+            server.requests.append((time.monotonic(), coordinate, 503 if failing else 200))
+        if url.path != '/reverse' or failing:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({'lat': str(coordinate[0]), 'lon': str(coordinate[1]), 'display_name': server.municipality,
+                           'address': {'town': server.municipality, 'state': 'Pennsylvania'}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # Keep the test output clean
+        pass
+
+
+class RetryTests(unittest.TestCase):
+
+    def test_503_is_retried_with_backoff(self):
+        coordinate = (40.9584, -75.9746)
+        with StubNominatim(failures={coordinate: 2}) as server:
+            result = geocoding.geocode_coordinates([coordinate], domain=server.domain, scheme='http', rate=100,
+                                                   retries=3, backoff=0.1)
+        self.assertEqual(result, {coordinate: 'Hazleton'})
+        self.assertEqual([status for _, _, status in server.requests], [503, 503, 200])
+        # Backoff doubles per attempt, with up to 100% jitter on top
+        first, second, third = server.times(coordinate)
+        self.assertGreaterEqual(second - first, 0.1)
+        self.assertGreaterEqual(third - second, 0.2)
+
+    def test_gives_up_after_the_last_retry(self):
+        from geopy.exc import GeocoderServiceError
+        coordinate = (40.9584, -75.9746)
+        with StubNominatim(failures={coordinate: 10}) as server:
+            with self.assertRaises(GeocoderServiceError):
+                geocoding.geocode_coordinates([coordinate], domain=server.domain, scheme='http', rate=100,
+                                              retries=2, backoff=0.01)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_failed_lookup_keeps_earlier_results(self):
+        from geopy.exc import GeocoderServiceError
+        good, bad = (40.9584, -75.9746), (40.9700, -75.9800)
+        results = {}
+        with StubNominatim(failures={bad: 10}) as server:
+            with self.assertRaises(GeocoderServiceError):
+                geocoding.geocode_coordinates([good, bad], domain=server.domain, scheme='http', rate=100,
+                                              workers=1, retries=1, backoff=0.01, results=results)
+        self.assertEqual(results, {good: 'Hazleton'})
+
+
+class RateLimitTests(unittest.TestCase):
+
+    def test_token_bucket_spaces_requests_across_workers(self):
+        rate = 20
+        coordinates = [(40.95 + i / 1000, -75.97) for i in range(10)]
+        with StubNominatim() as server:
+            result = geocoding.geocode_coordinates(coordinates, domain=server.domain, scheme='http', rate=rate,
+                                                   workers=4)
+        self.assertEqual(len(result), len(coordinates))
+        times = sorted(server.times())
+        # A bucket of one token lets one request through every 1/rate seconds, however many threads ask
+        self.assertGreaterEqual(times[-1] - times[0], (len(times) - 1) / rate * 0.9)
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        self.assertGreaterEqual(min(gaps), 1 / rate * 0.5)
+
+    def test_token_bucket_allows_a_burst_of_its_capacity(self):
+        bucket = geocoding.TokenBucket(rate=1, capacity=3)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+
+class CacheTests(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = geocache.GeocodeCache(os.path.join(directory.name, 'geocode.sqlite'))
+        self.addCleanup(self.cache.close)
+
+    def test_second_run_is_served_from_the_cache(self):
+        latitudes = pandas.Series([40.9584, 40.9700, 40.9584])
+        longitudes = pandas.Series([-75.9746, -75.9800, -75.9746])
+        with StubNominatim() as server:
+            first = geocoding.resolve_municipalities(latitudes, longitudes, cache=self.cache, domain=server.domain,
+                                                     scheme='http', rate=100)
+            requests = len(server.requests)
+            second = geocoding.resolve_municipalities(latitudes, longitudes, cache=self.cache,
+                                                      domain=server.domain, scheme='http', rate=100)
+        self.assertEqual(requests, 2)  # The repeated pole is only asked for once
+        self.assertEqual(len(server.requests), requests)
+        self.assertEqual(first.tolist(), ['Hazleton'] * 3)
+        self.assertEqual(second.tolist(), first.tolist())
+
+    def test_neighbouring_poles_share_one_request(self):
+        # Both round to the same key at the cache's 4 decimal places
+        latitudes = pandas.Series([40.95841, 40.95842])
+        longitudes = pandas.Series([-75.97461, -75.97462])
+        with StubNominatim() as server:
+            result = geocoding.resolve_municipalities(latitudes, longitudes, cache=self.cache, domain=server.domain,
+                                                      scheme='http', rate=100)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(result.tolist(), ['Hazleton', 'Hazleton'])
+
+    def test_results_before_a_failure_are_cached(self):
+        from geopy.exc import GeocoderServiceError
+        latitudes = pandas.Series([40.9584, 40.9700])
+        longitudes = pandas.Series([-75.9746, -75.9800])
+        with StubNominatim(failures={(40.97, -75.98): 10}) as server:
+            with self.assertRaises(GeocoderServiceError):
+                geocoding.resolve_municipalities(latitudes, longitudes, cache=self.cache, domain=server.domain,
+                                                 scheme='http', rate=100, workers=1, retries=0)
+        self.assertEqual(self.cache.get_many([(40.9584, -75.9746), (40.97, -75.98)]),
+                         {(40.9584, -75.9746): 'Hazleton'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Feet-inches conversion and make ready amounts, including the values Katapult notes get wrong.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas  # noqa: E402
+import heights  # noqa: E402
+
+
+class ToInchesTests(unittest.TestCase):
+
+    def test_valid_heights(self):
+        inches, errors = heights.to_inches(pandas.Series(['23-4', '0-0', ' 18-11 ']))
+        self.assertEqual(inches.tolist(), [280, 0, 227])
+        self.assertTrue(errors.isna().all())
+
+    def test_invalid_heights_are_reported_per_row(self):
+        inches, errors = heights.to_inches(pandas.Series(['23-12', '23', "23' 4", '23-4.5', '-1-0', '23-4']))
+        self.assertEqual(inches.isna().tolist(), [True, True, True, True, True, False])
+        self.assertIn('inches must be between 0 and 11', errors[0])
+        self.assertIn("format 'feet-inches'", errors[1])
+        self.assertIn("format 'feet-inches'", errors[2])
+        self.assertIn('whole numbers', errors[3])
+        self.assertIn('feet cannot be negative', errors[4])
+        self.assertTrue(errors[0].startswith('23-12: '))
+
+    def test_round_trip(self):
+        self.assertEqual(heights.to_feet_inches(pandas.Series([280, None], dtype='Int64')).tolist(),
+                         ['23\'-4"', pandas.NA])
+
+
+class AmountTests(unittest.TestCase):
+
+    def test_amounts(self):
+        inches, errors = heights.to_amount(pandas.Series(['6', '6.5', 'six', None], dtype=object))
+        self.assertEqual(inches[0], 6)
+        self.assertTrue(inches[1:].isna().all())
+        self.assertIn('whole number of inches', errors[1])
+        self.assertIn('must be a number of inches', errors[2])
+        self.assertTrue(pandas.isna(errors[3]))
+
+    def test_apply_delta(self):
+        result, errors = heights.apply_delta(pandas.Series([280, 10, 280], dtype='Int64'),
+                                             pandas.Series([-6, -12, 0.5]))
+        self.assertEqual(result[0], 274)
+        self.assertIn('below the ground', errors[1])
+        self.assertIn('whole number of inches', errors[2])
+        self.assertTrue(result[1:].isna().all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Make ready note parsing: well-formed lines, malformed values and lines that are almost, but not quite, an attachment.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas  # noqa: E402
+import make_ready  # noqa: E402
+
+
+def parse(*notes: str) -> pandas.DataFrame:
+    """parse_notes for one pole per note."""
+    return make_ready.parse_notes(pandas.DataFrame({'SCID': [str(i + 1) for i in range(len(notes))],
+                                                    'Make Ready Notes': list(notes)}))
+
+
+class ParseNotesTests(unittest.TestCase):
+
+    def test_well_formed_lines(self):
+        table = parse('Comcast: Com at 23-4 Raise 6\nLoop Telecom Pennsylvania LLC: Proposed Strand at 22-9 Attach')
+        self.assertEqual(table['Company'].tolist(), ['COMCAST', make_ready.LOOP])
+        self.assertEqual(table['Attachment Type'].tolist(), ['Com', 'Strand'])
+        self.assertEqual(table['Existing Height'].tolist(), [280, 273])
+        self.assertEqual(table['Delta'].tolist(), [6, 0])
+        self.assertEqual(table['New Height'].tolist(), [286, 273])
+        self.assertTrue(table['Error'].isna().all())
+
+    def test_lower_is_a_negative_delta(self):
+        table = parse('Verizon Pennsylvania Inc.: Guy at 20-0 Lower 4.')
+        self.assertEqual(table['Delta'].tolist(), [-4])
+        self.assertEqual(table['New Height'].tolist(), [236])
+
+    def test_near_misses_are_kept_with_an_error(self):
+        notes = ['Comcast: com at 23-4 raise 6', 'Comcast: Com  at 23-4 Raise 6', 'Comcast: Com at 23\' 4" Raise 6']
+        table = parse('\n'.join(notes + ['Comcast: Com at 23-4 Raise 6']))
+        self.assertEqual(table['Line'].tolist(), [0, 1, 2, 3])
+        self.assertTrue(table['Error'].iloc[:3].notna().all())
+        self.assertTrue(table['Existing Height'].iloc[:3].isna().all())
+        self.assertIn("Com at 23' 4\" Raise 6", table['Error'].iloc[2])
+        self.assertTrue(pandas.isna(table['Error'].iloc[3]))
+
+    def test_lines_without_an_attachment_are_skipped(self):
+        table = parse('Comcast: moving the drop to the other side\nSomeone else: Com at 23-4 Raise 6')
+        self.assertTrue(table.empty)
+
+    def test_malformed_values_are_reported(self):
+        table = parse('Comcast: Com at 23-14 Raise 6\nComcast: Com at 23-4 Raise 6.5\nComcast: Com at 23-4 Lower\n'
+                      'Comcast: Com at 0-2 Lower 6')
+        errors = table['Error'].tolist()
+        self.assertIn('inches must be between 0 and 11', errors[0])
+        self.assertIn('whole number of inches', errors[1])
+        self.assertIn('needs an amount', errors[2])
+        self.assertIn('below the ground', errors[3])
+
+    def test_errors_go_to_the_error_log(self):
+        table = parse('Comcast: com at 23-4 raise 6\nComcast: Com at 23-4 Raise 6')
+        with tempfile.TemporaryDirectory() as directory:
+            make_ready.report_errors(table, directory)
+            with open(os.path.join(directory, 'error.log')) as f:
+                log = f.read().splitlines()
+        self.assertEqual(len(log), 1)
+        self.assertTrue(log[0].startswith('SCID 1, make ready line 1: '))
+
+    def test_missing_notes_column_gives_an_empty_table(self):
+        table = make_ready.parse_notes(pandas.DataFrame({'SCID': ['1', '2']}))
+        self.assertTrue(table.empty)
+        self.assertEqual(list(table.columns), make_ready.COLUMNS)
+
+    def test_blank_notes_give_an_empty_table(self):
+        table = make_ready.parse_notes(pandas.DataFrame({'SCID': ['1'], 'Make Ready Notes': [float('nan')]}))
+        self.assertTrue(table.empty)
+
+    def test_chunked_parse_matches_whole_parse(self):
+        notes = ['Comcast: Com at 23-4 Raise 6\ncomcast: com at 1-1 raise 1', None, 'Comcast: Com at 20-0 Attach']
+        file = pandas.DataFrame({'SCID': ['1', '2', '3'] * 3, 'Make Ready Notes': notes * 3})
+        previous, make_ready.PROGRESS_POLES = make_ready.PROGRESS_POLES, 2
+        try:
+            chunked = make_ready.parse_notes(file, progress=lambda *args: None)
+        finally:
+            make_ready.PROGRESS_POLES = previous
+        pandas.testing.assert_frame_equal(chunked, make_ready.parse_notes(file))
+
+
+
+class BelowLoopTests(unittest.TestCase):
+
+    def test_lists_other_companies_under_loops_strand(self):
+        loop = 'Loop Telecom Pennsylvania LLC'
+        file = pandas.DataFrame({'SCID': ['1', '2'], 'Make Ready Notes': [
+            f'{loop}: Proposed Strand at 22-0 Attach\n{loop}: Guy at 18-0 Attach\n{loop}: Guy at 25-0 Attach\n'
+            'Comcast: Com at 21-0 Attach\nComcast: Guy at 20-0 Attach\n'
+            'Verizon Pennsylvania Inc.: Strand at 19-0 Attach',
+            f'{loop}: Guy at 25-0 Attach\nComcast: Com at 21-0 Attach']})
+        attachments = make_ready.parse_notes(file)
+        table = make_ready.below_loop(make_ready.AttachmentIndex(attachments, file.index))
+        # Pole 2 has no Loop strand or com to measure from
+        self.assertEqual(table['SCID'].tolist(), ['1'])
+        self.assertEqual(table['Proposed Height'].tolist(), [264])
+        self.assertEqual([table[f'Attacher {rank}'][0] for rank in (1, 2)], ['COMCAST', 'VERIZON WIRELESS(AERIAL)'])
+        self.assertEqual([table[f'Height {rank}'][0] for rank in (1, 2)], [252, 228])
+        self.assertTrue(pandas.isna(table['Attacher 3'][0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+The three ways an export is read (CSV, calamine, openpyxl streaming) give the same normalized frame.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas  # noqa: E402
+import file_actions as fa  # noqa: E402
+
+HEADERS = ['scid', 'latitude', 'longitude', 'node_type', 'pole_owner', 'ppl company_tag', 'pole_tag', 'unknown_tag',
+           'make_ready_notes', 'address', 'not_needed']
+ROWS = [
+    ['1', 40.95, -75.97, 'pole', 'PPL Company', '12345', None, None, 'Comcast: Com at 23-4 Raise 6',
+     '12 Church St, Hazleton, PA 18201, USA', 'x'],
+    ['002', 40.96, None, 'pole', 'Verizon Pennsylvania Inc.', 'NT', None, None, None, None, 'y'],
+    ['3.A', None, -75.98, 'reference', None, None, None, None, None, 'Hazleton, PA', None],
+]
+
+
+class ReaderTests(unittest.TestCase):
+
+    def setUp(self):
+        import openpyxl
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.xlsx = os.path.join(directory.name, 'nodes.xlsx')
+        self.csv = os.path.join(directory.name, 'nodes.csv')
+        workbook = openpyxl.Workbook()
+        workbook.active.append(HEADERS)
+        for row in ROWS:
+            workbook.active.append(row)
+        workbook.save(self.xlsx)
+        # pole_tag and unknown_tag are blank in every row
+        pandas.DataFrame(ROWS, columns=HEADERS).to_csv(self.csv, index=False)
+
+    def read(self, file_path, engine=None):
+        if engine is None:
+            return fa.read_and_normalize(file_path)
+        with mock.patch.object(fa, 'excel_engine', return_value=engine):
+            return fa.read_and_normalize(file_path)
+
+    def test_streaming_matches_csv(self):
+        streamed = self.read(self.xlsx, 'openpyxl')
+        pandas.testing.assert_frame_equal(streamed, self.read(self.csv))
+        self.assertEqual(streamed['Tag'].tolist()[:2], ['12345', pandas.NA])
+
+    def test_calamine_matches_streaming(self):
+        try:
+            import python_calamine  # noqa: F401
+        except ImportError:
+            self.skipTest('python-calamine is not installed')
+        pandas.testing.assert_frame_equal(self.read(self.xlsx, 'calamine'), self.read(self.xlsx, 'openpyxl'))
+
+    def test_blank_columns_are_text(self):
+        raw = fa.read_xlsx_streaming(self.xlsx)
+        self.assertEqual(raw['pole_tag'].dtype, fa.TEXT_DTYPE)
+        self.assertTrue(raw['pole_tag'].isna().all())
+        self.assertNotIn('not_needed', raw.columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+The previous-pole distance and the duplicate pole check.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas  # noqa: E402
+import spatial  # noqa: E402
+
+# About 3.6 ft of latitude
+CLOSE = 0.00001
+# About 365 ft of latitude
+APART = 0.001
+
+
+class PoleColumnsTests(unittest.TestCase):
+
+    def test_stacked_poles_are_flagged(self):
+        file = pandas.DataFrame({'SCID': ['1', '2'], 'Pole Type': ['pole', 'pole'],
+                                 'Latitude': [40.0, 40.0 + CLOSE], 'Longitude': [-75.0, -75.0]})
+        columns = spatial.pole_columns(file)
+        self.assertEqual(columns['Nearby Pole'].tolist(), ['2', '1'])
+        self.assertAlmostEqual(columns['Nearby Pole (ft)'][0], 3.6, places=1)
+
+    def test_other_nodes_are_not_nearby_poles(self):
+        file = pandas.DataFrame({'SCID': ['1', '2', '3', '3.A'], 'Pole Type': ['pole', 'anchor', 'pole', 'pole'],
+                                 'Latitude': [40.0, 40.0 + CLOSE, 40.0 + APART, 40.0 + APART + CLOSE],
+                                 'Longitude': [-75.0] * 4})
+        columns = spatial.pole_columns(file)
+        self.assertTrue(columns['Nearby Pole'].isna().all())
+        self.assertTrue(columns['Nearby Pole (ft)'].isna().all())
+
+    def test_previous_pole_skips_other_nodes(self):
+        file = pandas.DataFrame({'SCID': ['1', '2A', '3', '4'], 'Pole Type': ['pole', 'pole', 'reference', 'pole'],
+                                 'Latitude': [40.0, 40.5, 40.5, 40.0 + APART], 'Longitude': [-75.0] * 4})
+        previous = spatial.pole_columns(file)['Previous Pole (ft)']
+        self.assertTrue(previous[[0, 1, 2]].isna().all())
+        self.assertAlmostEqual(previous[3], 364.8, places=0)
+
+    def test_without_node_types_every_numbered_row_is_a_pole(self):
+        file = pandas.DataFrame({'SCID': ['1', '2'], 'Latitude': [40.0, 40.0 + APART], 'Longitude': [-75.0, -75.0]})
+        self.assertAlmostEqual(spatial.pole_columns(file)['Previous Pole (ft)'][1], 364.8, places=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+"""
+Watches a folder for Katapult exports and runs the selected exports on every new or changed file, without the
+window:
+
+    python poletool.py --watch //share/katapult-drops -a vetro mrn verizon -o "//share/exports/{stem}"
+
+Files are picked up once their size and modification time have not changed for --settle seconds (and, for .xlsx,
+once the workbook is a complete zip file), so exports still being copied in are left alone. Processed files are
+moved to done/ and failed ones to failed/ inside the watched folder, next to a .log with the job's status.
+"""
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from poletool import INPUT_EXTENSIONS
+
+DONE_DIR = 'done'
+FAILED_DIR = 'failed'
+# A file that stays unchanged for this many settle periods without looking complete is processed anyway, so a
+# corrupt export ends up in failed/ instead of sitting in the folder
+GIVE_UP_SETTLES = 10
+
+
+def _warm_worker(geocode: bool = False):
+    """
+    Imports the export stack once per worker process, so jobs don't pay for pandas or pypdf. With `geocode` (only
+    the Verizon export with the API looks up municipalities) the boundaries and the geocode cache are loaded too.
+    """
+    import jobs  # noqa: F401
+    import pdf_forms  # noqa: F401
+    if geocode:
+        import geocache
+        import geocoding
+        geocoding.load_resolver()
+        geocache.default_cache()
+
+
+def is_complete(file_path: str) -> bool:
+    """False while a file is still being written: it can't be opened, or an .xlsx has no zip directory yet."""
+    try:
+        with open(file_path, 'rb'):
+            pass
+    except OSError:  # e.g. still locked by the copy on Windows
+        return False
+    if file_path.lower().endswith('.xlsx'):
+        return zipfile.is_zipfile(file_path)
+    return True
+
+
+def move_to(file_path: str, directory: str) -> str:
+    """Moves the file into `directory`, adding a timestamp when a file of that name was moved there before."""
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, os.path.basename(file_path))
+    if os.path.exists(target):
+        stem, extension = os.path.splitext(os.path.basename(file_path))
+        target = os.path.join(directory, f'{stem}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}{extension}')
+    shutil.move(file_path, target)
+    return target
+
+
+class FolderWatcher:
+    """
+    Polls `folder` for input files and runs each through `process(file_path) -> status` in a pool of `workers`
+    long-lived processes, at most `workers` files at a time. A file counts as ready once its (size, mtime) has
+    stayed the same for `settle` seconds and `is_complete` says so; a file dropped again under the same name after
+    it was moved away is a new file. `warm_geocoding` also loads the municipal boundaries in every worker up front.
+    """
+
+    def __init__(self, folder: str, process, workers: int = 1, interval: float = 2.0, settle: float = 5.0,
+                 done_dir: str = None, failed_dir: str = None, report=None, warm_geocoding: bool = False):
+        self.folder = os.path.abspath(folder)
+        self.process = process
+        self.workers = workers
+        self.interval = interval
+        self.settle = settle
+        self.done_dir = done_dir or os.path.join(self.folder, DONE_DIR)
+        self.failed_dir = failed_dir or os.path.join(self.folder, FAILED_DIR)
+        self.report = report or (lambda status: None)
+        self.warm_geocoding = warm_geocoding
+        self._seen = {}  # path -> ((size, mtime), first seen with that signature)
+        self._handled = {}  # path -> signature, for processed files that couldn't be moved away
+        self._running = {}  # future -> path
+        self.settling = 0  # Files seen in the last scan that haven't been still for `settle` seconds yet
+
+    def scan(self) -> list[str]:
+        """Input files in the folder that are ready to process, oldest first."""
+        now = time.monotonic()
+        ready, present = [], set()
+        self.settling = 0
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:  # The share went away, try again next poll
+            return []
+        for entry in entries:
+            name = entry.name
+            if not entry.is_file() or not name.lower().endswith(INPUT_EXTENSIONS) or name.startswith(('~$', '.')):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            present.add(entry.path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._handled.get(entry.path) == signature or entry.path in self._running.values():
+                continue
+            previous = self._seen.get(entry.path)
+            if previous is None or previous[0] != signature:
+                self._seen[entry.path] = (signature, now)
+                self.settling += 1
+            elif now - previous[1] < self.settle:
+                self.settling += 1
+            elif is_complete(entry.path) or now - previous[1] >= self.settle * GIVE_UP_SETTLES:
+                ready.append((stat.st_mtime_ns, entry.path))
+        # Forget files that were moved away or deleted
+        for path in set(self._seen) - present:
+            del self._seen[path]
+        for path in set(self._handled) - present:
+            del self._handled[path]
+        return [path for _, path in sorted(ready)]
+
+    def _finish(self, file_path: str, status: dict):
+        directory = self.done_dir if status['success'] else self.failed_dir
+        try:
+            status['moved_to'] = move_to(file_path, directory)
+            with open(f"{os.path.splitext(status['moved_to'])[0]}.log", 'w') as f:
+                json.dump(status, f, indent=2, default=str)
+        except OSError as e:  # Left in place; it is only picked up again once it changes
+            status['error'] = status['error'] or f'Could not move the file: {e}'
+            self._handled[file_path] = self._seen.get(file_path, (None,))[0]
+        self._seen.pop(file_path, None)
+        self.report(status)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_warm_worker, initargs=(self.warm_geocoding,))
+
+    def _failed(self, file_path: str, error: str):
+        self._finish(file_path, {'file': file_path, 'success': False, 'error': error, 'actions': [],
+                                 'reused_poles': 0, 'seconds': 0.0})
+
+    def _restart(self, pool: ProcessPoolExecutor, error: Exception) -> ProcessPoolExecutor:
+        """
+        Replaces a pool whose worker died (out of memory, a crash in a native library). Every file that was in it
+        fails, since there is no telling which one took the worker down; the watcher itself carries on.
+        """
+        for file_path in list(self._running.values()):
+            self._failed(file_path, f'Worker process died: {error or type(error).__name__}')
+        self._running.clear()
+        pool.shutdown(wait=False, cancel_futures=True)
+        return self._new_pool()
+
+    def run(self, once: bool = False):
+        """
+        Watches until interrupted. With `once`, returns once the files already there (and any that arrive while
+        they run) are processed; files that don't look complete yet are left where they are.
+        """
+        pool = self._new_pool()
+        try:
+            while True:
+                for file_path in self.scan():
+                    if len(self._running) >= self.workers:
+                        break
+                    try:
+                        self._running[pool.submit(self.process, file_path)] = file_path
+                    except BrokenProcessPool as e:  # The file stays ready and is submitted to the new pool
+                        pool = self._restart(pool, e)
+                        break
+                if self._running:
+                    done, _ = wait(self._running, timeout=self.interval, return_when=FIRST_COMPLETED)
+                    broken = None
+                    for future in done:
+                        file_path = self._running.pop(future)
+                        try:
+                            status = future.result()
+                        except BrokenProcessPool as e:
+                            broken = e
+                            self._failed(file_path, f'Worker process died: {e}')
+                            continue
+                        except Exception as e:  # Raised by `process` itself, or its status couldn't be pickled
+                            self._failed(file_path, str(e))
+                            continue
+                        self._finish(file_path, status)
+                    if broken is not None:
+                        pool = self._restart(pool, broken)
+                elif once and not self.settling:
+                    return
+                else:
+                    time.sleep(self.interval)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,172 @@
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas
+import instrumentation
+
+# Formats that can be written next to an Excel output, e.g. for importing the same table into QGIS
+SIDE_OUTPUTS = ('csv', 'parquet')
+
+# Characters Windows does not allow in file names, plus control characters
+INVALID_FILENAME_CHARACTERS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+RESERVED_FILENAMES = {'CON', 'PRN', 'AUX', 'NUL', *(f'COM{i}' for i in range(1, 10)),
+                      *(f'LPT{i}' for i in range(1, 10))}
+# Rows between progress events while a workbook is written
+PROGRESS_ROWS = 5000
+
+
+def excel_engine() -> str:
+    """
+    Prefers xlsxwriter, which streams rows to disk in constant-memory mode. openpyxl's write-only mode is the
+    fallback; both keep only the current row in memory instead of the whole workbook.
+    """
+    try:
+        import xlsxwriter  # noqa: F401
+        return 'xlsxwriter'
+    except ImportError:
+        return 'openpyxl'
+
+
+def _rows(frame: pandas.DataFrame):
+    """Yields each row as a list of plain Python values, with None for every missing value."""
+    columns = []
+    for _, column in frame.items():
+        values = column.astype(object).to_numpy(copy=True)
+        values[column.isna().to_numpy()] = None
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def _write_xlsxwriter(output_path, sheets: dict, progress=None):
+    import xlsxwriter
+    done, total = 0, sum(len(frame) for frame in sheets.values())
+    workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+    try:
+        # Same header look as DataFrame.to_excel
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        for sheet_name, frame in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            # constant_memory flushes each row once the next one starts, so cells must be written row by row
+            worksheet.write_row(0, 0, [str(column) for column in frame.columns], header_format)
+            for row, values in enumerate(_rows(frame), start=1):
+                worksheet.write_row(row, 0, values)
+                done += 1
+                if progress and done % PROGRESS_ROWS == 0:
+                    progress('Rows written', done, total)
+    finally:
+        workbook.close()
+
+
+def _write_openpyxl(output_path, sheets: dict, progress=None):
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    workbook = openpyxl.Workbook(write_only=True)
+    done, total = 0, sum(len(frame) for frame in sheets.values())
+    thin = Side(style='thin')
+    for sheet_name, frame in sheets.items():
+        worksheet = workbook.create_sheet(sheet_name)
+        header = []
+        for column in frame.columns:
+            cell = WriteOnlyCell(worksheet, value=str(column))
+            cell.font = Font(bold=True)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.alignment = Alignment(horizontal='center', vertical='top')
+            header.append(cell)
+        worksheet.append(header)
+        for values in _rows(frame):
+            worksheet.append(values)
+            done += 1
+            if progress and done % PROGRESS_ROWS == 0:
+                progress('Rows written', done, total)
+    workbook.save(output_path)
+
+
+def write_excel(output_path, sheets: dict, engine: str = None, progress=None):
+    """
+    Writes DataFrames to one workbook, one sheet per item, without the index.
+
+    Args:
+        sheets: Sheet name to DataFrame, in sheet order.
+        engine: 'xlsxwriter' or 'openpyxl', defaults to `excel_engine()`.
+        progress: Optional callback, called as progress('Rows written', done, total) every PROGRESS_ROWS rows.
+            Whatever it raises (e.g. a cancelled job) stops the write and the partial workbook is removed.
+    """
+    try:
+        if (engine or excel_engine()) == 'xlsxwriter':
+            _write_xlsxwriter(output_path, sheets, progress)
+        else:
+            _write_openpyxl(output_path, sheets, progress)
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+
+def write_side_outputs(output_path, sheets: dict, formats=()) -> list[str]:
+    """
+    Writes every sheet again as CSV and/or Parquet next to `output_path`: name.csv for a single sheet, or
+    name-Sheet.csv per sheet.
+
+    Returns:
+        The paths written.
+    """
+    stem = os.path.splitext(output_path)[0]
+    written = []
+    for output_format in formats:
+        if output_format not in SIDE_OUTPUTS:
+            raise ValueError(f'Unknown side output {output_format!r}, expected one of {SIDE_OUTPUTS}')
+        for sheet_name, frame in sheets.items():
+            side_path = f'{stem}.{output_format}' if len(sheets) == 1 else f'{stem}-{sheet_name}.{output_format}'
+            if output_format == 'csv':
+                frame.to_csv(side_path, index=False)
+            else:
+                frame.to_parquet(side_path, index=False)
+            written.append(side_path)
+    return written
+
+
+def write(output_path, sheets: dict, side_outputs=(), engine: str = None, progress=None):
+    """Writes the workbook, plus any requested side outputs. `progress` is passed on to write_excel."""
+    with instrumentation.stage('write') as entry:
+        write_excel(output_path, sheets, engine=engine, progress=progress)
+        write_side_outputs(output_path, sheets, side_outputs)
+        entry.set(rows_out=sum(len(frame) for frame in sheets.values()), file=os.path.basename(output_path),
+                  engine=engine or excel_engine())
+
+
+def write_many(workbooks: dict, side_outputs=(), workers: int = None, progress=None):
+    """
+    Writes several workbooks side by side in a process pool.
+
+    Args:
+        workbooks: Output path to the `sheets` dict for that workbook.
+        workers: Writer processes. 1 writes in this process; None uses every core, up to one per workbook.
+        progress: Optional callback, called as progress(message, done, total) after each workbook.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(workbooks))
+    if workers <= 1:
+        for done, (output_path, sheets) in enumerate(workbooks.items(), start=1):
+            write(output_path, sheets, side_outputs=side_outputs)
+            if progress:
+                progress('Files written', done, len(workbooks))
+        return
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(write, output_path, sheets, side_outputs)
+                   for output_path, sheets in workbooks.items()]
+        for done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            if progress:
+                progress('Files written', done, len(workbooks))
+
+
+def safe_filename(name: str) -> str:
+    """Makes a value such as a municipality name usable as part of a file name on Windows and Linux."""
+    name = INVALID_FILENAME_CHARACTERS.sub('_', str(name)).strip().rstrip('.')
+    if not name:
+        return '_'
+    if name.split('.')[0].upper() in RESERVED_FILENAMES:
+        return f'_{name}'
+    return name